@@ -8,6 +8,7 @@ Created on 13.07.2022
 import argparse
 from pathlib import Path
 
+from nashome.utils.constants import TMDB_MAX_CONNECTIONS
 from nashome.utils.renamer import cleanup_recordings
 
 def main():
@@ -21,10 +22,12 @@ def main():
     parser.add_argument('-n', '-nt', "--no-tmdb", action='store_true', help="Set this flag to rename files without using tmdb or eit content.")
     parser.add_argument('-l', "--language", type=str, default="de-DE", help="Set this flag to change language code (default: de-DE).")
     parser.add_argument('-ta', "--try-all-seasons", action='store_true', help="If specified, season id will not be read from title. All season ids will be tried.")
+    parser.add_argument('-o', "--offline", action='store_true', help="Set this flag to resolve names from the local TMDB snapshot only (see snapshot-tmdb).")
+    parser.add_argument('-j', "--jobs", type=int, default=TMDB_MAX_CONNECTIONS, help=f"Number of recordings to resolve concurrently (default: {TMDB_MAX_CONNECTIONS}).")
     
     args = parser.parse_args()
 
-    cleanup_recordings(paths=args.files, series=args.series, force_tmdb=args.force_tmdb, force_rename=args.force_rename, dash=args.dash, no_tmdb=args.no_tmdb, language_code=args.language, try_all_seasons=args.try_all_seasons)
+    cleanup_recordings(paths=args.files, series=args.series, force_tmdb=args.force_tmdb, force_rename=args.force_rename, dash=args.dash, no_tmdb=args.no_tmdb, language_code=args.language, try_all_seasons=args.try_all_seasons, jobs=args.jobs, offline=args.offline)
 
 if __name__ == "__main__":
     main()
@@ -2,7 +2,10 @@
 import argparse
 from pathlib import Path
 
+from nashome.utils.constants import PIPELINE_DETECT_WORKERS, PIPELINE_CUT_WORKERS, PIPELINE_SETTLE_SECONDS, PIPELINE_ORDERS
 from nashome.utils.pipeline import cleanup_and_autocut
+from nashome.utils.pipeline_watch import watch_and_autocut
+from nashome.utils.pipeline_worker import enqueue_recordings, run_autocut_worker
 
 def main():
     # argument parsing
@@ -12,14 +15,49 @@ def main():
     parser.add_argument('outdir', metavar="outdir-root-directory", type=Path, help="Path to the series output root directory.")
     parser.add_argument('-o', "--offset", type=float, default=0, help="Set the start offset of the movie in minutes.")
     parser.add_argument('-l', "--length", type=float, help="Set the length of the movie in minutes.")
+    parser.add_argument('-e', "--max-errors", type=int, help="Skip recordings with more transport stream continuity errors than this.\nWithout it, recordings with an .ap file are not scanned for errors.")
+    parser.add_argument("--detect-workers", type=int, default=PIPELINE_DETECT_WORKERS, help=f"Number of recordings searched for templates concurrently (default: {PIPELINE_DETECT_WORKERS}).")
+    parser.add_argument("--cut-workers", type=int, default=PIPELINE_CUT_WORKERS, help=f"Number of recordings trimmed concurrently (default: {PIPELINE_CUT_WORKERS}).")
+    parser.add_argument("--order", choices=PIPELINE_ORDERS, default="shortest", help="Order of the recordings: cheapest first by length and the detection speed of their series (default),\noldest first, or in directory order.")
+    parser.add_argument("--restart", action='store_true', help="Set this flag to ignore the job journal and process all recordings from the start.")
+    parser.add_argument('-w', "--watch", action='store_true', help="Set this flag to keep running and cut every recording as soon as it is finished.")
+    parser.add_argument("--settle", type=float, default=PIPELINE_SETTLE_SECONDS, help=f"With --watch, seconds a recording must not grow to count as finished (default: {PIPELINE_SETTLE_SECONDS}).")
+    parser.add_argument("--enqueue", action='store_true', help="Set this flag to add all recordings to the shared work queue in the output directory.")
+    parser.add_argument("--worker", action='store_true', help="Set this flag to process recordings from the shared work queue until it is empty.")
+    parser.add_argument("--worker-id", type=str, help="Name of this worker in the work queue (default: <hostname>-<pid>).")
+    parser.add_argument("--offline", action='store_true', help="Rename from the local TMDB snapshot only (see snapshot-tmdb).")
     
     args = parser.parse_args()
 
-    cleanup_and_autocut(recordings_root_path=args.recordings, 
-                        template_root_directory=args.template, 
-                        outdir_root_path=args.outdir,
-                        offset=args.offset,
-                        movie_length_minutes=args.length)
+    if args.enqueue or args.worker:
+        if args.enqueue:
+            enqueue_recordings(recordings_root_path=args.recordings, template_root_directory=args.template, outdir_root_path=args.outdir)
+        if args.worker:
+            run_autocut_worker(recordings_root_path=args.recordings,
+                               template_root_directory=args.template,
+                               outdir_root_path=args.outdir,
+                               worker_id=args.worker_id,
+                               offset=args.offset,
+                               movie_length_minutes=args.length,
+                               max_continuity_errors=args.max_errors,
+                               offline=args.offline)
+        return
+
+    options = dict(template_root_directory=args.template,
+                   outdir_root_path=args.outdir,
+                   offset=args.offset,
+                   movie_length_minutes=args.length,
+                   max_continuity_errors=args.max_errors,
+                   offline=args.offline,
+                   detect_workers=args.detect_workers,
+                   cut_workers=args.cut_workers,
+                   restart=args.restart,
+                   order=args.order)
+
+    if args.watch:
+        watch_and_autocut(recordings_root_path=args.recordings, settle_seconds=args.settle, **options)
+    else:
+        cleanup_and_autocut(recordings_root_path=args.recordings, **options)
 
 if __name__ == "__main__":
     main()
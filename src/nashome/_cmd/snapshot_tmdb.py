@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+import argparse
+from pathlib import Path
+
+from nashome.tmdb.snapshot import get_snapshot_path, refresh_snapshot
+from nashome.utils.constants import SERIES_LIST, TMDB_MAX_CONNECTIONS
+
+def main():
+    # argument parsing
+    parser = argparse.ArgumentParser(description="Store the TMDB data of all known series in a local snapshot for offline renaming.", formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('-o', "--output", type=Path, help=f"Path to the snapshot file (default: {get_snapshot_path()}).")
+    parser.add_argument('-l', "--languages", type=str, nargs='+', default=["de-DE"], help="Language codes to store (default: de-DE).")
+    parser.add_argument('-r', "--refresh", action='store_true', help="Set this flag to ignore the TMDB response cache and fetch everything again.")
+    parser.add_argument('-j', "--jobs", type=int, default=TMDB_MAX_CONNECTIONS, help=f"Number of series to fetch concurrently (default: {TMDB_MAX_CONNECTIONS}).")
+
+    args = parser.parse_args()
+
+    # de-DE is always needed, the renamer takes episode names from it
+    language_codes = list(dict.fromkeys(["de-DE"] + args.languages))
+    snapshot = refresh_snapshot(SERIES_LIST, language_codes, path=args.output, jobs=args.jobs, force=args.refresh)
+    print(f"Stored {len(snapshot)} documents in {args.output or get_snapshot_path()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Cached access to the TMDB API.
+"""
+import os
+import requests
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+from nashome.config.config import tmdb_api_token
+from nashome.utils.cache import ResponseCache, get_cache_dir
+from nashome.utils.constants import TMDB_API_URL, TMDB_API_URL_ENVIRONMENT_VARIABLE, TMDB_CACHE_FILENAME, TMDB_SERIES_TTL, TMDB_SEASON_TTL, TMDB_EPISODE_TTL, TMDB_MAX_CONNECTIONS, TMDB_TIMEOUT
+
+_response_cache:ResponseCache = None
+_response_cache_lock = threading.Lock()
+
+_session:requests.Session = None
+_session_lock = threading.Lock()
+
+# All season documents of the process are fetched by one pool no larger than the connection pool
+_season_executor:ThreadPoolExecutor = None
+_season_executor_lock = threading.Lock()
+
+# While set, all documents are served from this snapshot and TMDB is never contacted
+_snapshot = None
+
+# In-process documents by key, a pending future is shared by all threads requesting the same document
+_documents:dict[str, tuple[float, Future]] = {}
+_documents_lock = threading.Lock()
+
+def build_session() -> requests.Session:
+    """Creates a session with keep-alive connection pool and retry strategy for TMDB requests."""
+    session = requests.Session()
+    retries = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+        raise_on_status=False,
+    )
+    # With pool_block, requests beyond the pool wait for a free connection instead of opening one that is discarded
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=TMDB_MAX_CONNECTIONS, pool_block=True, max_retries=retries)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({
+        "accept": "application/json",
+        "Authorization": f"Bearer {tmdb_api_token}"
+    })
+    return session
+
+def get_session() -> requests.Session:
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = build_session()
+        return _session
+
+def get_season_executor() -> ThreadPoolExecutor:
+    global _season_executor
+    with _season_executor_lock:
+        if _season_executor is None:
+            _season_executor = ThreadPoolExecutor(max_workers=TMDB_MAX_CONNECTIONS, thread_name_prefix="tmdb-season")
+        return _season_executor
+
+def get_api_url() -> str:
+    return os.environ.get(TMDB_API_URL_ENVIRONMENT_VARIABLE, TMDB_API_URL).rstrip('/')
+
+def get_response_cache() -> ResponseCache:
+    global _response_cache
+    cache_dir = get_cache_dir()
+    with _response_cache_lock:
+        if _response_cache is None or _response_cache.path != cache_dir / TMDB_CACHE_FILENAME:
+            _response_cache = ResponseCache(cache_dir / TMDB_CACHE_FILENAME)
+        return _response_cache
+
+def get_document(path:str, language_code:str, ttl:float) -> dict:
+    """
+    Returns the TMDB document at path (e.g. '/tv/60572'), served from the response cache if it is younger than ttl seconds.
+
+    Concurrent requests for the same document are coalesced into a single fetch, and every
+    document is kept in memory for the rest of the process (up to ttl).
+    """
+    if _snapshot is not None:
+        return _snapshot.get_document(path, language_code)
+
+    url = f"{get_api_url()}{path}"
+    key = f"{url}?language={language_code}"
+
+    with _documents_lock:
+        entry = _documents.get(key)
+        if entry is not None and time.time() - entry[0] <= ttl:
+            future, owner = entry[1], False
+        else:
+            future, owner = Future(), True
+            _documents[key] = (time.time(), future)
+
+    if not owner:
+        return future.result()
+
+    try:
+        document, ok = _fetch_document(url, key, language_code, ttl)
+    except BaseException as e:
+        future.set_exception(e)
+        with _documents_lock:
+            _documents.pop(key, None)
+        raise
+
+    future.set_result(document)
+    # Errors are passed on to the waiting callers, but fetched again by later ones
+    if not ok:
+        with _documents_lock:
+            _documents.pop(key, None)
+    return document
+
+@contextmanager
+def use_snapshot(snapshot):
+    """
+    Serves all documents from the given TmdbSnapshot (see nashome.tmdb.snapshot) within the with block.
+    """
+    global _snapshot
+    previous, _snapshot = _snapshot, snapshot
+    try:
+        yield snapshot
+    finally:
+        _snapshot = previous
+
+def _fetch_document(url:str, key:str, language_code:str, ttl:float) -> tuple[dict, bool]:
+    cache = get_response_cache()
+    document = cache.get(key, ttl)
+    if document is not None:
+        return document, True
+
+    response = get_session().get(url, params={"language": language_code}, timeout=TMDB_TIMEOUT)
+    document = response.json()
+    # Errors are never cached
+    if response.ok:
+        cache.put(key, document)
+    return document, response.ok
+
+def get_series(series_id:int, language_code:str) -> dict:
+    return get_document(f"/tv/{series_id}", language_code, TMDB_SERIES_TTL)
+
+def get_season(series_id:int, season_id:int, language_code:str) -> dict:
+    return get_document(f"/tv/{series_id}/season/{season_id}", language_code, TMDB_SEASON_TTL)
+
+def get_seasons(series_id:int, season_ids:list[int], language_code:str) -> list[dict]:
+    """
+    Fetches several seasons concurrently, the documents are returned in the order of season_ids.
+    Concurrent calls share one pool, so at most TMDB_MAX_CONNECTIONS seasons are requested at once.
+    """
+    if len(season_ids) <= 1:
+        return [get_season(series_id, season_id, language_code) for season_id in season_ids]
+    return list(get_season_executor().map(lambda season_id: get_season(series_id, season_id, language_code), season_ids))
+
+def get_episode(series_id:int, season_id:int, episode_id:int, language_code:str) -> dict:
+    return get_document(f"/tv/{series_id}/season/{season_id}/episode/{episode_id}", language_code, TMDB_EPISODE_TTL)
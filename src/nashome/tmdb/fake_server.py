@@ -0,0 +1,137 @@
+"""
+Local stand-in for the TMDB API, to run and benchmark the renamer offline.
+
+The server answers GET requests from a dictionary of documents keyed by path and language,
+e.g. '/tv/60572/season/1?language=de-DE'. A key without language matches every language.
+
+Usage from Python:
+    with FakeTmdbServer(build_series_documents(60572, "Pokemon", {1: ["Pikachu, ich wähle dich!"]})) as server:
+        ...  # all nashome.tmdb requests go to the fake server and a temporary cache
+
+Usage from the command line:
+    python -m nashome.tmdb.fake_server fixture.json --port 8765
+    NASHOME_TMDB_URL=http://127.0.0.1:8765 cleanup-recordings ...
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from nashome.utils.constants import CACHE_DIR_ENVIRONMENT_VARIABLE, TMDB_API_URL_ENVIRONMENT_VARIABLE
+
+def build_series_documents(series_id:int, name:str, seasons:dict[int, list[str]], language_code:str="de-DE") -> dict[str, dict]:
+    """
+    Builds the series and season documents of a series from its episode names per season.
+    """
+    documents = {
+        f"/tv/{series_id}?language={language_code}": {
+            "id": series_id,
+            "name": name,
+            "number_of_seasons": len(seasons)
+        }
+    }
+    for season_number, episode_names in seasons.items():
+        episodes = [{"name": episode_name, "episode_number": episode_number, "season_number": season_number}
+                    for episode_number, episode_name in enumerate(episode_names, start=1)]
+        documents[f"/tv/{series_id}/season/{season_number}?language={language_code}"] = {"season_number": season_number, "episodes": episodes}
+        for episode in episodes:
+            documents[f"/tv/{series_id}/season/{season_number}/episode/{episode['episode_number']}?language={language_code}"] = episode
+    return documents
+
+class FakeTmdbServer():
+    def __init__(self, documents:dict[str, dict], port:int=0, latency:float=0.0) -> None:
+        self.documents = documents
+        self.latency = latency
+        self.requests:list[str] = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._thread = None
+        self._environment = {}
+        self._cache_dir = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def request_count(self) -> int:
+        with self._lock:
+            return len(self.requests)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlsplit(self.path)
+                language = parse_qs(url.query).get("language", [""])[0]
+                with server._lock:
+                    server.requests.append(self.path)
+                if server.latency:
+                    threading.Event().wait(server.latency)
+
+                document = server.documents.get(f"{url.path}?language={language}", server.documents.get(url.path))
+                status = 200 if document is not None else 404
+                if document is None:
+                    document = {"success": False, "status_code": 34, "status_message": "The resource you requested could not be found."}
+
+                body = json.dumps(document).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        self.start()
+        # Route the TMDB client to this server and keep its responses out of the real cache
+        self._cache_dir = tempfile.TemporaryDirectory()
+        for key, value in ((TMDB_API_URL_ENVIRONMENT_VARIABLE, self.url), (CACHE_DIR_ENVIRONMENT_VARIABLE, self._cache_dir.name)):
+            self._environment[key] = os.environ.get(key)
+            os.environ[key] = value
+        return self
+
+    def __exit__(self, *exc_info):
+        for key, value in self._environment.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        self.stop()
+        self._cache_dir.cleanup()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve TMDB documents from a JSON fixture file.", formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('fixture', type=Path, help="JSON file mapping request paths (optionally with '?language=...') to documents.")
+    parser.add_argument('-p', "--port", type=int, default=8765, help="Port to listen on (default: 8765).")
+    parser.add_argument("--latency", type=float, default=0.0, help="Artificial delay per request in seconds.")
+
+    args = parser.parse_args()
+
+    server = FakeTmdbServer(json.loads(args.fixture.read_text(encoding="utf-8")), port=args.port, latency=args.latency)
+    print(f"Serving {args.fixture} on {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
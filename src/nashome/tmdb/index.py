@@ -0,0 +1,110 @@
+"""
+Episode title index of a series, built once per series, season list and language from the TMDB season documents.
+An index is rebuilt once it is older than the season documents may be cached, so episodes added to a running
+season become matchable in long-running processes as well.
+"""
+import threading
+import time
+from collections import defaultdict
+from typing import Callable
+
+from nashome.tmdb.client import get_seasons
+from nashome.utils.constants import TMDB_SEASON_TTL
+
+NGRAM_SIZE = 3
+
+def ngrams(string:str) -> set[str]:
+    return {string[i:i+NGRAM_SIZE] for i in range(len(string) - NGRAM_SIZE + 1)}
+
+class EpisodeIndex():
+    def __init__(self, season_documents:list[dict], normalize:Callable[[str], str]) -> None:
+        self.normalize = normalize
+        self.episodes:list[dict] = []
+        self.titles:list[str] = []
+        self.title_ngram_counts:list[int] = []
+        # Inverted index from n-gram to episode positions, titles too short for n-grams are always checked
+        self.ngram_index:dict[str, list[int]] = defaultdict(list)
+        self.short_titles:list[int] = []
+
+        for season_document in season_documents:
+            for episode in season_document.get('episodes', []):
+                title = normalize(episode['name'])
+                if not title:
+                    continue
+                position = len(self.episodes)
+                self.episodes.append(episode)
+                self.titles.append(title)
+                title_ngrams = ngrams(title)
+                self.title_ngram_counts.append(len(title_ngrams))
+                if not title_ngrams:
+                    self.short_titles.append(position)
+                for ngram in title_ngrams:
+                    self.ngram_index[ngram].append(position)
+
+    def __len__(self):
+        return len(self.episodes)
+
+    def candidates(self, title:str) -> list[int]:
+        """
+        Returns the positions of all episodes whose title may contain or be contained in the given normalized title.
+        """
+        title_ngrams = ngrams(title)
+        if not title_ngrams:
+            return range(len(self.episodes))
+
+        hits:dict[int, int] = defaultdict(int)
+        for ngram in title_ngrams:
+            for position in self.ngram_index.get(ngram, ()):
+                hits[position] += 1
+
+        # A contained string shares all of its n-grams with the containing one
+        candidates = [position for position, count in hits.items() if count == self.title_ngram_counts[position] or count == len(title_ngrams)]
+        return sorted(candidates + self.short_titles)
+
+    def find(self, title:str) -> dict:
+        """
+        Returns the TMDB episode whose normalized name best matches the title, or None.
+
+        An episode matches if one of both normalized names contains the other, the score is the
+        length ratio of both names. Ties are resolved in season and episode order.
+        """
+        title = self.normalize(title)
+        if not title:
+            return None
+
+        best_episode, best_score = None, 0.0
+        for position in self.candidates(title):
+            tmdb_title = self.titles[position]
+            if tmdb_title in title or title in tmdb_title:
+                score = min(len(tmdb_title), len(title)) / max(len(tmdb_title), len(title))
+                if score > best_score:
+                    best_episode, best_score = self.episodes[position], score
+                    if score == 1.0:
+                        break
+        return best_episode
+
+# Indices by (series id, season ids, language code, normalize) with the time they were built
+_episode_indices:dict[tuple, tuple[float, EpisodeIndex]] = {}
+_episode_indices_lock = threading.Lock()
+
+def get_episode_index(series_id:int, season_ids:list[int], language_code:str, normalize:Callable[[str], str]) -> EpisodeIndex:
+    key = (series_id, tuple(season_ids), language_code, normalize)
+    with _episode_indices_lock:
+        entry = _episode_indices.get(key)
+    if entry is not None and time.time() - entry[0] <= TMDB_SEASON_TTL:
+        return entry[1]
+
+    built = time.time()
+    index = EpisodeIndex(get_seasons(series_id, season_ids, language_code), normalize)
+    with _episode_indices_lock:
+        # Another thread may have built the same index in the meantime, expired indices are dropped
+        entry = _episode_indices.get(key)
+        if entry is None or entry[0] < built:
+            entry = _episode_indices[key] = (built, index)
+        for expired_key in [other_key for other_key, (other_built, _) in _episode_indices.items() if built - other_built > TMDB_SEASON_TTL]:
+            del _episode_indices[expired_key]
+    return entry[1]
+
+def clear_episode_indices() -> None:
+    with _episode_indices_lock:
+        _episode_indices.clear()
@@ -0,0 +1,140 @@
+"""
+Local snapshot of the TMDB series and season documents of all registered series.
+
+The snapshot is a gzipped JSON file of documents keyed by path and language (the fixture format of
+nashome.tmdb.fake_server), stripped to the fields the renamer reads. Within client.use_snapshot()
+all TMDB lookups are answered from it, episode documents are taken from their season.
+"""
+import gzip
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from nashome.tmdb.client import get_response_cache, get_series, get_seasons
+from nashome.utils.cache import get_cache_dir
+from nashome.utils.constants import TMDB_MAX_CONNECTIONS, TMDB_SNAPSHOT_FILENAME
+from nashome.utils.series import Series
+
+SERIES_FIELDS = ("id", "name", "number_of_seasons")
+EPISODE_FIELDS = ("name", "episode_number", "season_number")
+
+EPISODE_PATH_REGEX = re.compile(r"^(/tv/\d+/season/\d+)/episode/(\d+)$")
+
+NOT_FOUND_DOCUMENT = {"success": False, "status_code": 34, "status_message": "The resource you requested could not be found."}
+
+class TmdbSnapshot():
+    def __init__(self, documents:dict[str, dict], created:float=None) -> None:
+        self.documents = documents
+        self.created = time.time() if created is None else created
+
+    def __len__(self):
+        return len(self.documents)
+
+    def get_document(self, path:str, language_code:str) -> dict:
+        document = self.documents.get(f"{path}?language={language_code}")
+        if document is not None:
+            return document
+
+        match = EPISODE_PATH_REGEX.match(path)
+        if match is not None:
+            season = self.documents.get(f"{match.group(1)}?language={language_code}", {})
+            episode_number = int(match.group(2))
+            for episode in season.get("episodes", []):
+                if episode["episode_number"] == episode_number:
+                    return episode
+        return NOT_FOUND_DOCUMENT
+
+    def save(self, path:Path) -> None:
+        # Write to a temporary file first, a running pipeline never sees a half written snapshot
+        temporary_path = path.with_name(path.name + ".tmp")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with gzip.open(temporary_path, "wt", encoding="utf-8") as f:
+            json.dump({"created": self.created, "documents": self.documents}, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path:Path) -> "TmdbSnapshot":
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            content = json.load(f)
+        return cls(content["documents"], content["created"])
+
+def get_snapshot_path() -> Path:
+    return get_cache_dir() / TMDB_SNAPSHOT_FILENAME
+
+def build_snapshot(series_list:list[Series], language_codes:list[str], jobs:int=TMDB_MAX_CONNECTIONS) -> TmdbSnapshot:
+    """
+    Fetches the series and all season documents of every series in all languages.
+    Series that cannot be fetched are left out and reported at the end, offline renaming keeps their titles.
+    """
+    def fetch(item:tuple[int, str]) -> dict[str, dict]:
+        series_id, language_code = item
+        try:
+            series = get_series(series_id, language_code)
+            if "number_of_seasons" not in series:
+                print(f"TMDB: could not fetch series {series_id} ({language_code}): {series.get('status_message')}")
+                return None
+            season_ids = list(range(1, series["number_of_seasons"] + 1))
+            seasons = get_seasons(series_id, season_ids, language_code)
+        except Exception as e:
+            print(f"TMDB: could not fetch series {series_id} ({language_code}): {e}")
+            return None
+
+        documents = {f"/tv/{series_id}?language={language_code}": {field: series.get(field) for field in SERIES_FIELDS}}
+        for season_id, season in zip(season_ids, seasons):
+            episodes = [{field: episode.get(field) for field in EPISODE_FIELDS} for episode in season.get("episodes", [])]
+            documents[f"/tv/{series_id}/season/{season_id}?language={language_code}"] = {"season_number": season_id, "episodes": episodes}
+        print(f"TMDB: fetched series '{series.get('name')}' ({language_code}) with {len(season_ids)} seasons.")
+        return documents
+
+    series_ids = sorted({series.series_id for series in series_list})
+    items = [(series_id, language_code) for series_id in series_ids for language_code in language_codes]
+
+    documents = {}
+    skipped:list[tuple[int, str]] = []
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        for item, series_documents in zip(items, executor.map(fetch, items)):
+            if series_documents is None:
+                skipped.append(item)
+            else:
+                documents.update(series_documents)
+
+    if skipped:
+        names = {series.series_id: series.name for series in series_list}
+        print(f"Warning: {len(skipped)} series left out of the snapshot: " + ", ".join(f"{names[series_id]} ({series_id}, {language_code})" for series_id, language_code in skipped))
+    return TmdbSnapshot(documents)
+
+def refresh_snapshot(series_list:list[Series], language_codes:list[str], path:Path=None, jobs:int=TMDB_MAX_CONNECTIONS, force:bool=False) -> TmdbSnapshot:
+    """
+    Builds a new snapshot and replaces the one at path (default: the cache directory).
+    With force, the response cache is cleared first, so every document is fetched from TMDB.
+    """
+    if force:
+        get_response_cache().clear()
+    snapshot = build_snapshot(series_list, language_codes, jobs)
+    snapshot.save(path or get_snapshot_path())
+    return snapshot
+
+_snapshots:dict[Path, tuple[int, TmdbSnapshot]] = {}
+_snapshots_lock = threading.Lock()
+
+def load_snapshot(path:Path=None) -> TmdbSnapshot:
+    """
+    Returns the snapshot at path (default: the cache directory), or None if there is none.
+    The loaded snapshot is kept in memory until the file changes.
+    """
+    path = Path(path or get_snapshot_path())
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    with _snapshots_lock:
+        entry = _snapshots.get(path)
+        if entry is None or entry[0] != mtime_ns:
+            entry = (mtime_ns, TmdbSnapshot.load(path))
+            _snapshots[path] = entry
+        return entry[1]
@@ -0,0 +1,42 @@
+"""
+SQLite backed cache of JSON documents with a time to live, used for TMDB responses and YouTube metadata.
+
+The database runs in WAL mode with a busy timeout, so several processes (e.g. a
+nightly pipeline and a manual cleanup) can share one cache file. All cache files
+are kept in the directory returned by get_cache_dir.
+"""
+import json
+import os
+import time
+from pathlib import Path
+
+from nashome.utils.constants import CACHE_DIR_ENVIRONMENT_VARIABLE
+from nashome.utils.sqlite import ThreadConnections
+
+def get_cache_dir() -> Path:
+    return Path(os.environ.get(CACHE_DIR_ENVIRONMENT_VARIABLE, Path.home() / ".cache" / "nashome"))
+
+class ResponseCache():
+    def __init__(self, path:Path) -> None:
+        self.path = Path(path)
+        self._connections = ThreadConnections(self.path, ("PRAGMA journal_mode=WAL",
+                                                          "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, document TEXT NOT NULL, fetched REAL NOT NULL)"))
+
+    def get(self, key:str, ttl:float) -> dict:
+        """
+        Returns the cached document for key if it is younger than ttl seconds, otherwise None.
+        """
+        row = self._connections.get().execute("SELECT document, fetched FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None or time.time() - row[1] > ttl:
+            return None
+        return json.loads(row[0])
+
+    def put(self, key:str, document:dict) -> None:
+        connection = self._connections.get()
+        with connection:
+            connection.execute("INSERT OR REPLACE INTO responses (key, document, fetched) VALUES (?, ?, ?)", (key, json.dumps(document), time.time()))
+
+    def clear(self) -> None:
+        connection = self._connections.get()
+        with connection:
+            connection.execute("DELETE FROM responses")
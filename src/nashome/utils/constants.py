@@ -1,4 +1,7 @@
-from nashome.utils.series import Series
+import os
+from pathlib import Path
+
+from nashome.utils.series import Series, load_series_list
 from nashome.youtube.language import Language
 
 LANGUAGE_LIST:list[Language] = [
@@ -26,42 +29,68 @@ LANGUAGE_LIST:list[Language] = [
 
 # https://developer.themoviedb.org/reference/search-tv
 # https://developer.themoviedb.org/reference/tv-season-details
-SERIES_LIST:list[Series] = [
-    Series("Pokemon Horizonte", 220150, r".* Folge \d+ \|(.*?)\|.*"),
-    Series("Pokemon", 60572, r"(.*?)\|.*", r".*_S\d+E\d+_(.*?)\.(mp4|mkv)"),
-    Series("Die Kickers", 64049, r"Die Kickers - (.*) Folge \d+"),
-    Series("Paw Patrol", 57532, r".*\|(.*)\|.*"),
-    Series("PJ Masks", 65417, r"(?:Ganze Folge:*)?(.*?)[^\u0000-\uFFFF].*"),
-    Series("My Hero Academia", 65930),
-    Series("SpongeBob Schwammkopf", 387),
-    Series("Desperate Housewives", 693),
-    Series("Sex and the City", 105),
-    Series("And Just Like That", 116450),
-    Series("The Big Bang Theory", 1418),
-    Series("House of the Dragon", 94997),
-    Series("Game of Thrones", 1399),
-    Series("The Lazarus Project", 194567),
-    Series("Almania", 121062),
-    Series("Lieselotte", 105110),
-    Series("Mega Man", 1323),
-    Series("Teenage Mutant Ninja Turtles", 160, r".*_S\d+E\d+_(.*?)\.mp4"),
-    Series("Dragon Ball Z", 12971),
-    Series("Dragon Ball Super", 62715),
-    Series("Dragon Ball", 12609),
-    Series("House of Cards", 1425),
-    Series("Sisi", 153282),
-    Series("Die tollen Fußballstars", 25707),
-    Series("Captain Tsubasa - Super Kickers 2006", 24106),
-    Series("Captain Tsubasa", 77240),
-    Series("Chernobyl", 87108),
-    Series("Ich heirate eine Familie", 36778),
-    Series("Mila Superstar", 46348),
-    Series("Pippi Langstrumpf", 3714),
-    Series("Paw Patrol", 57532),
-    Series("Rubble & Crew", 214875)
-]
+SERIES_FILE_ENVIRONMENT_VARIABLE = "NASHOME_SERIES_FILE"
+SERIES_FILE = Path(os.environ.get(SERIES_FILE_ENVIRONMENT_VARIABLE, Path(__file__).parents[1] / "config" / "series.json"))
+SERIES_LIST:list[Series] = load_series_list(SERIES_FILE)
+
+# Directory of the local caches (TMDB responses and snapshot, YouTube metadata, worker journals)
+CACHE_DIR_ENVIRONMENT_VARIABLE = "NASHOME_CACHE_DIR"
+
+# https://developer.themoviedb.org/reference/intro/getting-started
+TMDB_API_URL = "https://api.themoviedb.org/3"
+TMDB_API_URL_ENVIRONMENT_VARIABLE = "NASHOME_TMDB_URL"
+TMDB_CACHE_FILENAME = "tmdb_cache.sqlite"
+TMDB_SNAPSHOT_FILENAME = "tmdb_snapshot.json.gz"
+
+# Connection pool size and (connect, read) timeout in seconds for TMDB requests
+TMDB_MAX_CONNECTIONS = 8
+TMDB_TIMEOUT = (5, 30)
+
+# Time to live of cached TMDB responses in seconds
+TMDB_SERIES_TTL = 24 * 60 * 60
+TMDB_SEASON_TTL = 7 * 24 * 60 * 60
+TMDB_EPISODE_TTL = 7 * 24 * 60 * 60
 
 TEMPLATE_START_DIRNAME = "start"
 TEMPLATE_END_DIRNAME = "end"
 
-STORED_VIDEOS_FILENAME = "stored_videos.json"
\ No newline at end of file
+TS_INDEX_SUFFIX = ".idx.npz"
+
+STORED_VIDEOS_FILENAME = "stored_videos.json"
+STORED_VIDEOS_DATABASE_FILENAME = "stored_videos.sqlite"
+
+# Number of videos downloaded concurrently from a playlist
+YOUTUBE_DOWNLOAD_JOBS = 4
+
+# Output formats of audio-only downloads, mp3 is transcoded and m4a is remuxed without conversion
+YOUTUBE_AUDIO_FORMATS = ("mp3", "m4a")
+
+# Concurrent metadata requests and time to live in seconds of the cached metadata of playlist videos
+YOUTUBE_METADATA_CACHE_FILENAME = "youtube_metadata.sqlite"
+YOUTUBE_METADATA_JOBS = 8
+YOUTUBE_METADATA_TTL = 7 * 24 * 60 * 60
+
+# Worker threads per stage and queue size between the stages of pipeline-autocut
+PIPELINE_RENAME_WORKERS = 1
+PIPELINE_DETECT_WORKERS = 1
+PIPELINE_CUT_WORKERS = 2
+PIPELINE_MOVE_WORKERS = 1
+PIPELINE_QUEUE_SIZE = 2
+PIPELINE_JOURNAL_FILENAME = ".autocut_journal.sqlite"
+
+# Order of new recordings in pipeline-autocut, and the recording length assumed per byte if there is no EIT duration
+PIPELINE_ORDERS = ("shortest", "oldest", "directory")
+PIPELINE_BYTES_PER_MINUTE = 50 * 1024 * 1024
+
+# Shared work queue of distributed pipeline-autocut workers, lease of a claimed recording in seconds and attempts per recording
+PIPELINE_WORK_QUEUE_FILENAME = ".autocut_queue.sqlite"
+# Journal of the distributed workers of one host, kept in the local cache directory
+PIPELINE_WORKER_JOURNAL_FILENAME = "autocut_journal.{host}.sqlite"
+PIPELINE_LEASE_SECONDS = 300
+# The staging directory of a worker that lost its lease is removed once it did not change for the lease plus this grace period
+PIPELINE_STAGING_GRACE_SECONDS = 600
+PIPELINE_MAX_ATTEMPTS = 3
+
+# A watched recording is finished if its size has not changed for this many seconds, changes are checked at the poll interval
+PIPELINE_SETTLE_SECONDS = 120
+PIPELINE_POLL_SECONDS = 30
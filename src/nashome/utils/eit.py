@@ -24,24 +24,43 @@ import chardet
 import os
 import re
 import struct
+import threading
 
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from pathlib import Path
+
+from nashome.utils.transport_stream import read_eit_event
 
 
 BYTE_TO_ENCODING = {
-	"1": 'iso-8859-5',
-	"2": 'iso-8859-6',
-	"3": 'iso-8859-7',
-	"4": 'iso-8859-8',
-	"5": 'iso-8859-9',
-	"6": 'iso-8859-10',
-	"7": 'iso-8859-11',
-	"9": 'iso-8859-13',
-	"10": 'iso-8859-14',
-	"11": 'iso-8859-15',
-	"21": 'utf-8'
+	0x01: 'iso-8859-5',
+	0x02: 'iso-8859-6',
+	0x03: 'iso-8859-7',
+	0x04: 'iso-8859-8',
+	0x05: 'iso-8859-9',
+	0x06: 'iso-8859-10',
+	0x07: 'iso-8859-11',
+	0x09: 'iso-8859-13',
+	0x0A: 'iso-8859-14',
+	0x0B: 'iso-8859-15',
+	0x15: 'utf-8'
 }
 
+# Deletion table for bytes.translate: control characters are dropped from
+# descriptor texts, line feeds (0x0A) are kept
+CONTROL_CHARACTERS = bytes(c for c in range(32) if c != 0x0A)
+
+# Text hidden from the user in short event descriptions
+HIDDEN_TEXT_REGEX = re.compile("<x>.*</x>")
+
+# This will fix EIT data of RTL group with missing line breaks in extended event description
+RTL_LINE_BREAK_REGEX = re.compile('((?:Moderat(?:ion:|or(?:in){0,1})|Vorsitz: |Jur(?:isten|y): |G(?:\xC3\xA4|a)st(?:e){0,1}: |Mit (?:Staatsanwalt|Richter(?:in){0,1}|den Schadenregulierern) |Julia Leisch).*?[a-z]+)(\'{0,1}[0-9A-Z\'])')
+
+# Number of parsed EIT files kept in the process-wide cache
+EIT_CACHE_SIZE = 4096
+
 def parseMJD(MJD):
 	# Parse 16 bit unsigned int containing Modified Julian Date,
 	# as per DVB-SI spec
@@ -57,6 +76,50 @@ def parseMJD(MJD):
 def unBCD(byte):
 	return (byte>>4)*10 + (byte & 0xf)
 
+# Parsed event data of one EIT file, shared by all EitContent instances of that file
+class EitCacheEntry():
+	__slots__ = ('eit', 'texts', 'event')
+
+	def __init__(self):
+		self.eit = {}
+		# Raw descriptor texts, read on first access to a text field
+		self.texts = None
+		# Raw event data, if it was extracted from the transport stream instead of an .eit file
+		self.event = None
+
+# Process-wide LRU cache, keyed by (path, mtime, size)
+_eit_cache:OrderedDict[tuple, EitCacheEntry] = OrderedDict()
+_eit_cache_lock = threading.Lock()
+
+def _get_cached_entry(key:tuple) -> EitCacheEntry:
+	with _eit_cache_lock:
+		entry = _eit_cache.get(key)
+		if entry is not None:
+			_eit_cache.move_to_end(key)
+		return entry
+
+def _put_cached_entry(key:tuple, entry:EitCacheEntry) -> EitCacheEntry:
+	with _eit_cache_lock:
+		# Another thread may have parsed the same file in the meantime
+		entry = _eit_cache.setdefault(key, entry)
+		_eit_cache.move_to_end(key)
+		while len(_eit_cache) > EIT_CACHE_SIZE:
+			_eit_cache.popitem(last=False)
+		return entry
+
+def _stat(path):
+	# One stat call instead of os.path.exists followed by os.stat
+	if not path:
+		return None
+	try:
+		return os.stat(path)
+	except (OSError, ValueError):
+		return None
+
+def clear_eit_cache() -> None:
+	with _eit_cache_lock:
+		_eit_cache.clear()
+
 # Eit File support class
 # Description
 # http://de.wikipedia.org/wiki/Event_Information_Table
@@ -65,28 +128,33 @@ class EitContent():
 	EIT_SHORT_EVENT_DESCRIPTOR = 0x4d
 	EIT_EXTENDED_EVENT_DESCRIPOR = 0x4e
 
-	def __init__(self, path=None, debug=False):
+	def __init__(self, path=None, debug=False, texts=False):
+		# With texts, the whole file is read at once and the descriptors are parsed from the same buffer
 		self.eit_file = None
+		self.ts_file = None
 		self.eit_mtime = 0
 
-		self.eit = {}
+		self.entry = EitCacheEntry()
+		self.eit = self.entry.eit
 		self.iso = None
 		self.debug = debug
 
 		self.__newPath(path)
-		self.__readEitFile()
+		self.__readEitFile(texts)
 
 	def __newPath(self, path):
 		if path:
+			path = os.fspath(path)
+			ts_file = path if path.endswith(".ts") else os.path.splitext(path)[0] + ".ts"
 			path = os.path.splitext(path)[0]
 
-			if not os.path.exists(path + ".eit"):
-				# Strip existing cut number
-				if path[-4:-3] == "_" and path[-3:].isdigit():
-					path = path[:-4]
+			# Strip existing cut number
+			if path[-4:-3] == "_" and path[-3:].isdigit() and not os.path.exists(path + ".eit"):
+				path = path[:-4]
 			path += ".eit"
 			if self.eit_file != path:
 				self.eit_file = path
+				self.ts_file = ts_file
 				self.eit_mtime = 0
 
 	def print(self, obj):
@@ -128,13 +196,13 @@ class EitContent():
 		return self.eit.get('duration', "")
 
 	def getEitName(self):
-		return self.eit.get('name', "").strip()
+		return self.__getText('name').strip()
 
 	def getEitDescription(self):
-		return self.eit.get('description', "").strip()
+		return self.__getText('description').strip()
 
 	def getEitShortDescription(self):
-		return self.eit.get('short_description', "").strip()
+		return self.__getText('short_description').strip()
 
 	def getEitExtendedDescription(self):
 		return self.getEitDescription()
@@ -152,261 +220,257 @@ class EitContent():
 	def getEitDate(self):
 		return self.__toDate(self.getEitStartDate(), self.getEitStartTime())
 
+	def readEitTexts(self):
+		# Reads the raw descriptor texts into the cache without decoding them
+		if self.entry.texts is None:
+			self.__readDescriptors()
+
+
 	##############################################################################
 	## File IO Functions
-	def __readEitFile(self):
-		data = ""
+	def __readEitFile(self, texts=False):
+		# Only the fixed event header is read here, descriptors are parsed on demand unless texts are requested
+		data = b""
 		path = self.eit_file
+		stat = _stat(path)
 
-		lang = "deu"
+		if stat is None:
+			# Without an .eit file, fall back to the EIT of the recording itself
+			path = self.ts_file
+			stat = _stat(path)
 
-		if path and os.path.exists(path):
-			mtime = os.path.getmtime(path)
-			if self.eit_mtime == mtime:
+		if stat is not None:
+			if self.eit_mtime == stat.st_mtime:
 				# File has not changed
 				pass
 
 			else:
-				#print "EMC TEST count Eit " + str(path)
-
 				# New path or file has changed
-				self.eit_mtime = mtime
-
-				# Read data from file
-				# OE1.6 with Pyton 2.6
-				#with open(self.eit_file, 'r') as file: lines = file.readlines()
-				f = None
-				try:
-					f = open(path, 'rb')
-					#lines = f.readlines()
-					data = f.read()
-				except Exception as e:
-					print(f"[EIT] Exception in readEitFile: {e}")
-				finally:
-					if f is not None:
-						f.close()
-
-				# Parse the data
-				if data and 12 <= len(data):
-					# go through events
-					pos = 0
-					e = struct.unpack(">HHBBBBBBH", data[pos:pos+12])
-					event_id = e[0]
-					date     = parseMJD(e[1])                         # Y, M, D
-					time     = unBCD(e[2]), unBCD(e[3]), unBCD(e[4])  # HH, MM, SS
-					duration = unBCD(e[5]), unBCD(e[6]), unBCD(e[7])  # HH, MM, SS
-					running_status  = (e[8] & 0xe000) >> 13
-					free_CA_mode    = e[8] & 0x1000
-					descriptors_len = e[8] & 0x0fff
-
-					if running_status in [1,2]:
-						self.eit['when'] = "NEXT"
-					elif running_status in [3,4]:
-						self.eit['when'] = "NOW"
-
-					self.eit['startdate'] = date
-					self.eit['starttime'] = time
-					self.eit['duration'] = duration
-
-					pos = pos + 12
-					name_event_descriptor = []
-					name_event_descriptor_multi = []
-					name_event_codepage = None
-					short_event_descriptor = []
-					short_event_descriptor_multi = []
-					short_event_codepage = None
-					extended_event_descriptor = []
-					extended_event_descriptor_multi = []
-					extended_event_codepage = None
-					component_descriptor = []
-					content_descriptor = []
-					linkage_descriptor = []
-					parental_rating_descriptor = []
-					endpos = len(data) - 1
-					prev1_ISO_639_language_code = "x"
-					prev2_ISO_639_language_code = "x"
-					while pos < endpos:
-						rec = data[pos]
-						if pos+1>=endpos:
-							break
-						length = data[pos+1] + 2
-						#if pos+length>=endpos:
-						#	break
-						if rec == 0x4D:
-							descriptor_tag = data[pos+1]
-							descriptor_length = data[pos+2]
-							ISO_639_language_code = str(data[pos+2:pos+5]).upper()
-							event_name_length = data[pos+5]
-							name_event_description = bytearray()
-							for i in range (pos+6,pos+6+event_name_length):
-								try:
-									if str(data[i])=="10" or int(str(data[i]))>31:
-										name_event_description += data[i].to_bytes()
-								except IndexError as e:
-									self.print("[EIT] Exception in readEitFile: " + str(e))
-							if not name_event_codepage:
-								try:
-									byte1 = str(data[pos+6])
-								except:
-									byte1 = ''
-								name_event_codepage = BYTE_TO_ENCODING[byte1] if byte1 in BYTE_TO_ENCODING else None
-								if name_event_codepage:
-									self.print("[EIT] Found name_event encoding-type: " + name_event_codepage)
-							name_event_description = name_event_description.decode("utf-8", "ignore")
-							short_event_description = bytearray()
-							if not short_event_codepage:
-								try:
-									byte1 = str(data[pos+7+event_name_length])
-								except:
-									byte1 = ''
-								short_event_codepage = BYTE_TO_ENCODING[byte1] if byte1 in BYTE_TO_ENCODING else None
-								if short_event_codepage:
-									self.print("[EIT] Found short_event encoding-type: " + short_event_codepage)
-							for i in range (pos+7+event_name_length,pos+length):
-								try:
-									if str(data[i])=="10" or int(str(data[i]))>31:
-										short_event_description += data[i].to_bytes()
-								except IndexError as e:
-									self.print("[EIT] Exception in readEitFile: " + str(e))
-							short_event_description = short_event_description.decode("utf-8", "ignore")
-							if ISO_639_language_code == lang:
-								short_event_descriptor.append(short_event_description)
-								name_event_descriptor.append(name_event_description)
-							if (ISO_639_language_code == prev1_ISO_639_language_code) or (prev1_ISO_639_language_code == "x"):
-								short_event_descriptor_multi.append(short_event_description)
-								name_event_descriptor_multi.append(name_event_description)
-							else:
-								short_event_descriptor_multi.append("\n\n" + short_event_description)
-								name_event_descriptor_multi.append(" " + name_event_description)
-							prev1_ISO_639_language_code = ISO_639_language_code
-						elif rec == 0x4E:
-							ISO_639_language_code = ""
-							for i in range (pos+3,pos+6):
-								ISO_639_language_code += chr(data[i])
-							ISO_639_language_code = ISO_639_language_code.upper()
-							extended_event_description = bytearray()
-							if not extended_event_codepage:
-								try:
-									byte1 = str(data[pos+8])
-								except:
-									byte1 = ''
-								extended_event_codepage = BYTE_TO_ENCODING[byte1] if byte1 in BYTE_TO_ENCODING else None
-								if extended_event_codepage:
-									self.print("[EIT] Found extended_event encoding-type: " + extended_event_codepage)
-							for i in range (pos+8,pos+length):
-								try:
-									if str(data[i])=="10" or int(str(data[i]))>31:
-										extended_event_description += data[i].to_bytes()
-								except IndexError as e:
-									self.print("[EIT] Exception in readEitFile: " + str(e))
-							extended_event_description = extended_event_description.decode("utf-8", "ignore")
-							if ISO_639_language_code == lang:
-								extended_event_descriptor.append(extended_event_description)
-							if (ISO_639_language_code == prev2_ISO_639_language_code) or (prev2_ISO_639_language_code == "x"):
-								extended_event_descriptor_multi.append(extended_event_description)
-							else:
-								extended_event_descriptor_multi.append("\n\n" + extended_event_description)
-							prev2_ISO_639_language_code = ISO_639_language_code
-						elif rec == 0x50:
-							component_descriptor.append(data[pos+8:pos+length])
-						elif rec == 0x54:
-							content_descriptor.append(data[pos+8:pos+length])
-						elif rec == 0x4A:
-							linkage_descriptor.append(data[pos+8:pos+length])
-						elif rec == 0x55:
-							parental_rating_descriptor.append(data[pos+2:pos+length])
+				self.eit_mtime = stat.st_mtime
+
+				key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+				entry = _get_cached_entry(key)
+				if entry is None:
+					entry = EitCacheEntry()
+
+					# Read header from file
+					try:
+						if path == self.ts_file:
+							entry.event = read_eit_event(path) or b""
+							data = entry.event
 						else:
-#							print "unsupported descriptor: %x %x" %(rec, pos + 12)
-#							print data[pos:pos+length]
-							pass
-						pos += length
-
-					if name_event_descriptor:
-						name_event_descriptor = "".join(name_event_descriptor)
-					else:
-						name_event_descriptor = ("".join(name_event_descriptor_multi)).strip()
-
-					if short_event_descriptor:
-						short_event_descriptor = "".join(short_event_descriptor)
+							with open(path, 'rb') as f:
+								data = f.read() if texts else f.read(12)
+					except Exception as e:
+						print(f"[EIT] Exception in readEitFile: {e}")
+
+					# Parse the header
+					if 12 <= len(data):
+						self.__parseHeader(data, entry.eit)
+						if texts:
+							entry.texts = self.__parseDescriptors(memoryview(data))
+						entry = _put_cached_entry(key, entry)
 					else:
-						short_event_descriptor = ("".join(short_event_descriptor_multi)).strip()
+						# No date clear all
+						entry.texts = {}
 
-					if extended_event_descriptor:
-						extended_event_descriptor = "".join(extended_event_descriptor)
-					else:
-						extended_event_descriptor = ("".join(extended_event_descriptor_multi)).strip()
-
-					if not(extended_event_descriptor):
-						extended_event_descriptor = short_event_descriptor
-						extended_event_codepage = short_event_codepage
-
-					if name_event_descriptor:
-						try:
-							if name_event_codepage:
-								if name_event_codepage != 'utf-8':
-									name_event_descriptor = name_event_descriptor.decode(name_event_codepage).encode("utf-8")
-								else:
-									name_event_descriptor.decode('utf-8')
-							else:
-								encdata = chardet.detect(name_event_descriptor)
-								enc = encdata['encoding'].lower()
-								confidence = str(encdata['confidence'])
-								self.print("[EIT] Detected name_event encoding-type: " + enc + " (" + confidence + ")")
-								if enc == "utf-8":
-									name_event_descriptor.decode(enc)
-								else:
-									name_event_descriptor = name_event_descriptor.decode(enc).encode('utf-8')
-						except (UnicodeDecodeError, AttributeError) as e:
-							self.print("[EIT] Exception in readEitFile: " + str(e))
-					self.eit['name'] = name_event_descriptor
-
-					if short_event_descriptor:
-						try:
-							if short_event_codepage:
-								if short_event_codepage != 'utf-8':
-									short_event_descriptor = short_event_descriptor.decode(short_event_codepage).encode("utf-8")
-								else:
-									short_event_descriptor.decode('utf-8')
-							else:
-								encdata = chardet.detect(short_event_descriptor)
-								enc = encdata['encoding'].lower()
-								confidence = str(encdata['confidence'])
-								self.print("[EIT] Detected short_event encoding-type: " + enc + " (" + confidence + ")")
-								if enc == "utf-8":
-									short_event_descriptor.decode(enc)
-								else:
-									short_event_descriptor = short_event_descriptor.decode(enc).encode('utf-8')
-						except (UnicodeDecodeError, AttributeError) as e:
-							self.print("[EIT] Exception in readEitFile: " + str(e))
-					self.eit['short_description'] = re.sub("<x>.*</x>", "", short_event_descriptor)
-
-					if extended_event_descriptor:
-						try:
-							if extended_event_codepage:
-								if extended_event_codepage != 'utf-8':
-									extended_event_descriptor = extended_event_descriptor.decode(extended_event_codepage).encode("utf-8")
-								else:
-									extended_event_descriptor.decode('utf-8')
-							else:
-								encdata = chardet.detect(extended_event_descriptor.encode())
-								enc = encdata['encoding'].lower()
-								confidence = str(encdata['confidence'])
-								self.print("[EIT] Detected extended_event encoding-type: " + enc + " (" + confidence + ")")
-								if enc == "utf-8":
-									extended_event_descriptor.decode(enc)
-								else:
-									extended_event_descriptor = extended_event_descriptor.decode(enc).encode('utf-8')
-						except (UnicodeDecodeError, AttributeError) as e:
-							self.print("[EIT] Exception in readEitFile: " + str(e))
-
-						# This will fix EIT data of RTL group with missing line breaks in extended event description
-						extended_event_descriptor = re.sub('((?:Moderat(?:ion:|or(?:in){0,1})|Vorsitz: |Jur(?:isten|y): |G(?:\xC3\xA4|a)st(?:e){0,1}: |Mit (?:Staatsanwalt|Richter(?:in){0,1}|den Schadenregulierern) |Julia Leisch).*?[a-z]+)(\'{0,1}[0-9A-Z\'])', r'\1\n\n\2', extended_event_descriptor)
-					self.eit['description'] = extended_event_descriptor
-
-				else:
-					# No date clear all
-					self.eit = {}
+				self.entry = entry
+				self.eit = entry.eit
 
 		else:
 			# No path or no file clear all
-			self.eit = {}
\ No newline at end of file
+			self.entry = EitCacheEntry()
+			self.entry.texts = {}
+			self.eit = self.entry.eit
+
+	def __readDescriptors(self):
+		data = b""
+		if self.entry.event is not None:
+			data = self.entry.event
+		else:
+			try:
+				with open(self.eit_file, 'rb') as f:
+					data = f.read()
+			except Exception as e:
+				print(f"[EIT] Exception in readEitFile: {e}")
+
+		if 12 <= len(data):
+			self.entry.texts = self.__parseDescriptors(memoryview(data))
+		else:
+			self.entry.texts = {}
+
+	def __getText(self, field):
+		if field not in self.eit:
+			if self.entry.texts is None:
+				self.__readDescriptors()
+			self.eit[field] = self.__decodeField(field)
+		return self.eit[field]
+
+	def __decodeField(self, field):
+		if field == 'name':
+			return self.__decodeText(*self.entry.texts.get('name_event', (b"", None)), "name_event")
+
+		if field == 'short_description':
+			short_event_descriptor = self.__decodeText(*self.entry.texts.get('short_event', (b"", None)), "short_event")
+			return HIDDEN_TEXT_REGEX.sub("", short_event_descriptor)
+
+		extended_event_descriptor = self.__decodeText(*self.entry.texts.get('extended_event', (b"", None)), "extended_event")
+		if extended_event_descriptor:
+			extended_event_descriptor = RTL_LINE_BREAK_REGEX.sub(r'\1\n\n\2', extended_event_descriptor)
+		return extended_event_descriptor
+
+	def __parseHeader(self, data, eit):
+		e = struct.unpack(">HHBBBBBBH", data[:12])
+		event_id = e[0]
+		date     = parseMJD(e[1])                         # Y, M, D
+		time     = unBCD(e[2]), unBCD(e[3]), unBCD(e[4])  # HH, MM, SS
+		duration = unBCD(e[5]), unBCD(e[6]), unBCD(e[7])  # HH, MM, SS
+		running_status  = (e[8] & 0xe000) >> 13
+		free_CA_mode    = e[8] & 0x1000
+		descriptors_len = e[8] & 0x0fff
+
+		if running_status in [1,2]:
+			eit['when'] = "NEXT"
+		elif running_status in [3,4]:
+			eit['when'] = "NOW"
+
+		eit['startdate'] = date
+		eit['starttime'] = time
+		eit['duration'] = duration
+
+	def __parseDescriptors(self, data, lang="DEU"):
+		# Descriptor texts are collected as memoryview slices and joined once per field
+		name_event_descriptor = []
+		name_event_descriptor_multi = []
+		name_event_codepage = None
+		short_event_descriptor = []
+		short_event_descriptor_multi = []
+		short_event_codepage = None
+		extended_event_descriptor = []
+		extended_event_descriptor_multi = []
+		extended_event_codepage = None
+		prev1_ISO_639_language_code = None
+		prev2_ISO_639_language_code = None
+
+		pos = 12
+		endpos = len(data) - 1
+		while pos < endpos:
+			rec = data[pos]
+			if pos+1>=endpos:
+				break
+			length = data[pos+1] + 2
+			if rec == self.EIT_SHORT_EVENT_DESCRIPTOR:
+				ISO_639_language_code = bytes(data[pos+2:pos+5]).decode('latin-1').upper()
+				event_name_length = data[pos+5]
+				name_event_description = data[pos+6:pos+6+event_name_length]
+				short_event_description = data[pos+7+event_name_length:pos+length]
+				if not name_event_codepage and name_event_description:
+					name_event_codepage = BYTE_TO_ENCODING.get(name_event_description[0])
+					if name_event_codepage:
+						self.print("[EIT] Found name_event encoding-type: " + name_event_codepage)
+				if not short_event_codepage and short_event_description:
+					short_event_codepage = BYTE_TO_ENCODING.get(short_event_description[0])
+					if short_event_codepage:
+						self.print("[EIT] Found short_event encoding-type: " + short_event_codepage)
+				if ISO_639_language_code == lang:
+					short_event_descriptor.append(short_event_description)
+					name_event_descriptor.append(name_event_description)
+				if (ISO_639_language_code == prev1_ISO_639_language_code) or (prev1_ISO_639_language_code is None):
+					short_event_descriptor_multi.append(short_event_description)
+					name_event_descriptor_multi.append(name_event_description)
+				else:
+					short_event_descriptor_multi += [b"\n\n", short_event_description]
+					name_event_descriptor_multi += [b" ", name_event_description]
+				prev1_ISO_639_language_code = ISO_639_language_code
+			elif rec == self.EIT_EXTENDED_EVENT_DESCRIPOR:
+				ISO_639_language_code = bytes(data[pos+3:pos+6]).decode('latin-1').upper()
+				extended_event_description = data[pos+8:pos+length]
+				if not extended_event_codepage and extended_event_description:
+					extended_event_codepage = BYTE_TO_ENCODING.get(extended_event_description[0])
+					if extended_event_codepage:
+						self.print("[EIT] Found extended_event encoding-type: " + extended_event_codepage)
+				if ISO_639_language_code == lang:
+					extended_event_descriptor.append(extended_event_description)
+				if (ISO_639_language_code == prev2_ISO_639_language_code) or (prev2_ISO_639_language_code is None):
+					extended_event_descriptor_multi.append(extended_event_description)
+				else:
+					extended_event_descriptor_multi += [b"\n\n", extended_event_description]
+				prev2_ISO_639_language_code = ISO_639_language_code
+			pos += length
+
+		name_event_descriptor = self.__joinText(name_event_descriptor, name_event_descriptor_multi)
+		short_event_descriptor = self.__joinText(short_event_descriptor, short_event_descriptor_multi)
+		extended_event_descriptor = self.__joinText(extended_event_descriptor, extended_event_descriptor_multi)
+
+		if not extended_event_descriptor:
+			extended_event_descriptor = short_event_descriptor
+			extended_event_codepage = short_event_codepage
+
+		return {
+			'name_event': (name_event_descriptor, name_event_codepage),
+			'short_event': (short_event_descriptor, short_event_codepage),
+			'extended_event': (extended_event_descriptor, extended_event_codepage)
+		}
+
+	def __joinText(self, descriptor, descriptor_multi):
+		# Prefer the descriptors in the requested language, otherwise take all languages
+		if descriptor:
+			return b"".join(descriptor).translate(None, CONTROL_CHARACTERS)
+		return b"".join(descriptor_multi).translate(None, CONTROL_CHARACTERS).strip()
+
+	def __decodeText(self, text, codepage, field):
+		if not text:
+			return ""
+		if not codepage:
+			encdata = chardet.detect(text)
+			codepage = (encdata['encoding'] or "utf-8").lower()
+			self.print("[EIT] Detected " + field + " encoding-type: " + codepage + " (" + str(encdata['confidence']) + ")")
+		try:
+			return text.decode(codepage, "ignore")
+		except LookupError as e:
+			self.print("[EIT] Exception in readEitFile: " + str(e))
+			return text.decode("utf-8", "ignore")
+
+# Compact metadata record of one recording, the text fields are decoded on first access
+class EitRecord():
+	__slots__ = ('path', 'eit', 'startdate', 'starttime', 'duration')
+
+	def __init__(self, path:Path, eit:EitContent) -> None:
+		self.path = path
+		self.eit = eit
+		self.startdate = eit.getEitStartDate()
+		self.starttime = eit.getEitStartTime()
+		self.duration = eit.getEitDuration()
+
+	@property
+	def name(self) -> str:
+		return self.eit.getEitName()
+
+	@property
+	def short_description(self) -> str:
+		return self.eit.getEitShortDescription()
+
+	@property
+	def description(self) -> str:
+		return self.eit.getEitDescription()
+
+	def __repr__(self):
+		return f"EitRecord({self.path.name}, {self.name})"
+
+def read_eit_record(path:str|Path) -> EitRecord:
+	# A file already cached by its header alone gets its texts read now
+	eit = EitContent(path, texts=True)
+	eit.readEitTexts()
+	return EitRecord(Path(path), eit)
+
+def read_eit_records(paths:list[str|Path], max_workers:int=8) -> list[EitRecord]:
+	"""
+	Reads the given EIT files in a thread pool and fills the process-wide cache with their headers
+	and raw descriptor texts, so later EitContent instances of the same files do not touch the disk
+	again. Texts are only decoded when they are used.
+	"""
+	with ThreadPoolExecutor(max_workers=max_workers) as executor:
+		return list(executor.map(read_eit_record, paths))
+
+def scan_eit_directory(directory:str|Path, max_workers:int=8) -> list[EitRecord]:
+	return read_eit_records(sorted(Path(directory).glob("*.eit")), max_workers=max_workers)
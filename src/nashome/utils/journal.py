@@ -0,0 +1,74 @@
+"""
+SQLite journal of the recordings processed by pipeline-autocut.
+
+Every recording is journaled under the path of its source movie file together with the last
+stage it completed, so a rerun after a crash resumes each recording where it stopped.
+A source file that changed since it was journaled (size or mtime) starts over.
+
+The journal also keeps the template detection time per series and recorded minute, which the
+pipeline uses to estimate the cost of a recording.
+"""
+import time
+from pathlib import Path
+
+from nashome.utils.sqlite import ThreadConnections
+
+# Stages of a recording in the order they are completed
+JOURNAL_STATES = ("staged", "renamed", "detected", "cut", "moved")
+
+class JournalEntry():
+    __slots__ = ("state", "movie_file", "start_time", "end_time", "trimmed_file", "updated")
+
+    def __init__(self, state:str, movie_file:str, start_time:float, end_time:float, trimmed_file:str, updated:float) -> None:
+        self.state = state
+        self.movie_file = Path(movie_file) if movie_file else None
+        self.start_time = start_time
+        self.end_time = end_time
+        self.trimmed_file = Path(trimmed_file) if trimmed_file else None
+        self.updated = updated
+
+class JobJournal():
+    def __init__(self, path:Path) -> None:
+        self.path = Path(path)
+        self._connections = ThreadConnections(self.path, ("PRAGMA journal_mode=WAL",
+                                                          "CREATE TABLE IF NOT EXISTS jobs (source TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, state TEXT NOT NULL, "
+                                                          "movie_file TEXT, start_time REAL, end_time REAL, trimmed_file TEXT, updated REAL NOT NULL)",
+                                                          "CREATE TABLE IF NOT EXISTS detection (series TEXT PRIMARY KEY, minutes REAL NOT NULL, seconds REAL NOT NULL, count INTEGER NOT NULL)"))
+
+    def get(self, source:Path) -> JournalEntry:
+        """
+        Returns the journal entry of the source movie file, or None if it is unknown or has changed since.
+        """
+        row = self._connections.get().execute("SELECT size, mtime_ns, state, movie_file, start_time, end_time, trimmed_file, updated FROM jobs WHERE source = ?", (str(source),)).fetchone()
+        if row is None:
+            return None
+        stat = source.stat()
+        if (row[0], row[1]) != (stat.st_size, stat.st_mtime_ns):
+            return None
+        return JournalEntry(*row[2:])
+
+    def record(self, source:Path, state:str, movie_file:Path=None, start_time:float=None, end_time:float=None, trimmed_file:Path=None) -> None:
+        stat = source.stat()
+        connection = self._connections.get()
+        with connection:
+            connection.execute("INSERT OR REPLACE INTO jobs (source, size, mtime_ns, state, movie_file, start_time, end_time, trimmed_file, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                               (str(source), stat.st_size, stat.st_mtime_ns, state,
+                                str(movie_file) if movie_file else None, start_time, end_time, str(trimmed_file) if trimmed_file else None, time.time()))
+
+    def remove(self, source:Path) -> None:
+        connection = self._connections.get()
+        with connection:
+            connection.execute("DELETE FROM jobs WHERE source = ?", (str(source),))
+
+    def record_detection(self, series:str, minutes:float, seconds:float) -> None:
+        """Adds a template detection of seconds for a recording of the given length in minutes."""
+        connection = self._connections.get()
+        with connection:
+            connection.execute("INSERT INTO detection (series, minutes, seconds, count) VALUES (?, ?, ?, 1) "
+                               "ON CONFLICT(series) DO UPDATE SET minutes = minutes + excluded.minutes, seconds = seconds + excluded.seconds, count = count + 1",
+                               (series, minutes, seconds))
+
+    def detection_rates(self) -> dict[str, float]:
+        """Returns the detection seconds per recorded minute of every series."""
+        rows = self._connections.get().execute("SELECT series, seconds / minutes FROM detection WHERE minutes > 0").fetchall()
+        return dict(rows)
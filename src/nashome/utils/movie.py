@@ -7,6 +7,7 @@ import subprocess
 
 from nashome.utils.constants import TEMPLATE_START_DIRNAME, TEMPLATE_END_DIRNAME
 from nashome.utils.eit import EitContent
+from nashome.utils.transport_stream import load_keyframe_index
 
 def merge_audio_and_video(indir:Path, outpath:Path, episode_name:str=None, audio_offset:float=0.0):
     # Find audio and video file
@@ -49,6 +50,15 @@ def merge_audio_and_video(indir:Path, outpath:Path, episode_name:str=None, audio
     shutil.rmtree(indir)
     return process.returncode == 0
 
+def convert_audio(source:Path, outpath:Path) -> None:
+    """
+    Converts the audio file to the format of the outpath suffix, m4a is remuxed without re-encoding.
+    ffmpeg streams the file, so memory use does not depend on its length.
+    """
+    codec = ['-c:a', 'copy'] if outpath.suffix == '.m4a' else ['-c:a', 'libmp3lame']
+    command = ['ffmpeg', '-nostdin', '-i', str(source), '-vn', *codec, '-loglevel', 'error', str(outpath)]
+    subprocess.run(command, check=True)
+
 def find_template(frame:cv2.typing.MatLike, template:cv2.typing.MatLike, threshold:float=0.8) -> bool:
     """
     Searches for the template in the given frame.
@@ -77,6 +87,16 @@ def check_template_root_directory(template_root_directory:Path) -> tuple[list[Pa
     return start_template_image_paths, end_template_image_paths
 
 def cut_video(video_path:str|Path, template_dir:str|Path, outdir:str|Path, offset_minutes:float, movie_length_minutes:float) -> bool:
+    cut_times = detect_cut_times(video_path, template_dir, offset_minutes, movie_length_minutes)
+    if cut_times is None:
+        return False
+    trim_video(video_path, outdir, *cut_times)
+    return True
+
+def detect_cut_times(video_path:str|Path, template_dir:str|Path, offset_minutes:float, movie_length_minutes:float) -> tuple[float, float]:
+    """
+    Searches the start and end templates in the video and returns the start and end time of the movie in seconds, or None.
+    """
     # Create Path objects
     start_template_dir = Path(template_dir)/TEMPLATE_START_DIRNAME
     end_template_dir = Path(template_dir)/TEMPLATE_END_DIRNAME
@@ -84,7 +104,7 @@ def cut_video(video_path:str|Path, template_dir:str|Path, outdir:str|Path, offse
     # Check if the directories exist
     if not start_template_dir.is_dir() or not end_template_dir.is_dir():
         print("Error: Could not find start or end template directory.")
-        return False
+        return None
 
     # Get the template image paths
     start_template_image_paths, end_template_image_paths = check_template_root_directory(template_root_directory=Path(template_dir))
@@ -92,7 +112,7 @@ def cut_video(video_path:str|Path, template_dir:str|Path, outdir:str|Path, offse
     # Check if the template images exist
     if not start_template_image_paths or not end_template_image_paths:
         print("Error: Could not find start or end template images.")
-        return False
+        return None
 
     if not movie_length_minutes:
         print(f"Searching for movie length from EIT for {video_path}")
@@ -113,10 +133,12 @@ def cut_video(video_path:str|Path, template_dir:str|Path, outdir:str|Path, offse
     # Check if the video opened successfully
     if not cap.isOpened():
         print("Error: Could not open video.")
-        return False
+        return None
     
     start_frame_index = None
     end_frame_index = None
+    start_template_frame_index = None
+    end_template_frame_index = None
 
     # Get the frames per second (fps) of the video
     fps = cap.get(cv2.CAP_PROP_FPS)
@@ -136,6 +158,7 @@ def cut_video(video_path:str|Path, template_dir:str|Path, outdir:str|Path, offse
 
         # Check for the start template
         if start_frame_index is None and any([find_template(gray_frame, t) for t in start_templates]):
+            start_template_frame_index = frame_index
             start_frame_index = frame_index-frame_index%key_frame_size+key_frame_size
             print(f"Start template found at frame {start_frame_index}")
             if movie_length_minutes:
@@ -145,6 +168,7 @@ def cut_video(video_path:str|Path, template_dir:str|Path, outdir:str|Path, offse
         # Check for the end template
         elif start_frame_index is not None and end_frame_index is None:
             if any([find_template(gray_frame, t) for t in end_templates]):
+                end_template_frame_index = frame_index
                 end_frame_index = frame_index-frame_index%key_frame_size+key_frame_size
                 print(f"End template found at frame {end_frame_index}")
                 break
@@ -157,15 +181,27 @@ def cut_video(video_path:str|Path, template_dir:str|Path, outdir:str|Path, offse
     # Ensure both templates were found
     if start_frame_index is None or end_frame_index is None:
         print("Error: Could not find both templates in the video.")
-        return False
+        return None
 
     # Calculate start and end times in seconds
     start_time = start_frame_index / fps
     end_time = end_frame_index / fps
 
+    # Use the exact keyframe positions of the recording instead of the estimated key frame size
+    if Path(video_path).suffix == '.ts':
+        index = load_keyframe_index(video_path)
+        if index is not None and len(index.keyframe_pts):
+            start_time = index.keyframe_time_after(start_template_frame_index / fps)
+            end_time = index.keyframe_time_after(end_template_frame_index / fps)
+
     print(f"Start time: {start_time} seconds")
     print(f"End time: {end_time} seconds")
+    return start_time, end_time
 
+def trim_video(video_path:str|Path, outdir:str|Path, start_time:float, end_time:float) -> Path:
+    """
+    Copies the streams of the video between start and end time (in seconds) to a file of the same name in outdir.
+    """
     # Use FFmpeg to trim the video
     outdir = Path(outdir)
     outdir.mkdir(parents=True, exist_ok=True)
@@ -174,7 +210,7 @@ def cut_video(video_path:str|Path, template_dir:str|Path, outdir:str|Path, offse
     ffmpeg.input(video_path, ss=start_time, to=end_time).output(str(outpath), c='copy').run(overwrite_output=True)
 
     print(f"Trimmed video saved to {outdir}")
-    return True
+    return outpath
 
 def get_smallest_subtitle_track(input_file) -> int:
    """Ermittelt die kleinste Untertitelspur in der Datei mit ffprobe."""
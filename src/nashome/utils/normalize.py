@@ -0,0 +1,74 @@
+"""
+String normalization for file names and title comparison.
+
+Both functions sit on the hot path of every rename, series detection and TMDB comparison,
+so each one is a short chain of str.replace calls (plus one regex pass for filter_string).
+str.replace is several times faster than str.translate with a mapping table. filter_string
+results are memoized, replace_forbidden_characters is cheaper than the cache lookup.
+"""
+import re
+from functools import lru_cache
+from unidecode import unidecode
+
+NORMALIZE_CACHE_SIZE = 16384
+
+# Characters not allowed (or not wanted) in file names
+_FORBIDDEN_CHARACTERS = (
+    ("/", "-"),
+    (":", ""),
+    ("?", ""),
+    ("*", ""),
+    ('"', ""),
+    ("'", ""),
+    ("<", "-"),
+    (">", "-"),
+    ("|", "-"),
+    ("\\", "-")
+)
+
+# Single characters removed from titles, dashes and commas separate words until all whitespace is removed
+_FILTER_CHARACTERS = (
+    ("_", ""),
+    ("'", ""),
+    (".", ""),
+    ("!", ""),
+    ("?", ""),
+    ("-", " "),
+    (",", " "),
+    (":", ""),
+    ('"', "")
+)
+
+# Multi-character rules and whitespace removal in one pass. As none of the patterns overlap,
+# this equals applying them one after another.
+_FILTER_REGEX = re.compile(r"versus|&|\s+")
+_FILTER_REPLACEMENTS = {
+    "versus" : "vs",
+    "&" : "and"
+}
+
+def _filter_replacement(match:re.Match) -> str:
+    return _FILTER_REPLACEMENTS.get(match.group(), "")
+
+def replace_forbidden_characters(string:str) -> str:
+    for character, replacement in _FORBIDDEN_CHARACTERS:
+        string = string.replace(character, replacement)
+    return string
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def _filter_string(string:str) -> str:
+    filtered_string = string.lower()
+    # unidecode leaves ASCII unchanged
+    if not filtered_string.isascii():
+        filtered_string = unidecode(filtered_string)
+    for character, replacement in _FILTER_CHARACTERS:
+        filtered_string = filtered_string.replace(character, replacement)
+    return _FILTER_REGEX.sub(_filter_replacement, filtered_string).strip()
+
+def filter_string(string:str|bytes) -> str:
+    """
+    Normalizes a title for comparison: lower case ASCII without punctuation and whitespace.
+    """
+    if isinstance(string, bytes):
+        string = string.decode('utf-8', 'ignore')
+    return _filter_string(string)
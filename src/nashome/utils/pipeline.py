@@ -1,21 +1,255 @@
+from contextlib import nullcontext
 from pathlib import Path
+import queue
 import shutil
+import threading
+import time
+from typing import Callable
 
-from nashome.utils.renamer import cleanup_recordings
-from nashome.utils.movie import cut_video, check_template_root_directory
+from nashome.tmdb.client import use_snapshot
+from nashome.tmdb.snapshot import get_snapshot_path, load_snapshot
+from nashome.utils.constants import PIPELINE_RENAME_WORKERS, PIPELINE_DETECT_WORKERS, PIPELINE_CUT_WORKERS, PIPELINE_MOVE_WORKERS, PIPELINE_QUEUE_SIZE, PIPELINE_JOURNAL_FILENAME, PIPELINE_BYTES_PER_MINUTE
+from nashome.utils.eit import EitContent
+from nashome.utils.journal import JobJournal
+from nashome.utils.renamer import PathNameIndex, cleanup_recordings
+from nashome.utils.movie import detect_cut_times, trim_video, check_template_root_directory
+from nashome.utils.staging import stage_file
+from nashome.utils.transport_stream import ACCESS_POINTS_SUFFIX, access_points_path, load_packet_index, read_access_points
 
-def cleanup_and_autocut(recordings_root_path:Path, template_root_directory:Path, outdir_root_path:Path, offset:float=0, movie_length_minutes:float=None):
-    # Check if the directories exist
-    if not recordings_root_path.is_dir():
-        print("Error: The recordings root path does not exist.")
+class RecordingJob():
+    """
+    One recording on its way through the pipeline, every stage fills in its results.
+    """
+    def __init__(self, source_movie_file:Path, source_files:list[Path], template_directory:Path, outdir:Path, staging_directory:Path, journal:JobJournal=None, series:str=None) -> None:
+        self.source_movie_file = source_movie_file
+        self.series = series
+        self.source_files = source_files
+        self.template_directory = template_directory
+        self.outdir = outdir
+        self.staging_directory = staging_directory
+        self.movie_file:Path = None
+        self.start_time:float = None
+        self.end_time:float = None
+        self.trimmed_file:Path = None
+        self.journal = journal
+        self.state:str = None
+        self.minutes = estimate_minutes(source_movie_file)
+        self.cost:float = None
+
+    @property
+    def name(self) -> str:
+        return self.source_movie_file.stem
+
+    def record(self, state:str) -> None:
+        self.state = state
+        if self.journal is not None:
+            self.journal.record(self.source_movie_file, state, self.movie_file, self.start_time, self.end_time, self.trimmed_file)
+
+    def resume(self) -> int:
+        """
+        Restores the results of a previous run from the journal and returns the index of the stage to continue with.
+        """
+        entry = self.journal.get(self.source_movie_file) if self.journal is not None else None
+        if entry is not None:
+            self.movie_file, self.start_time, self.end_time, self.trimmed_file = entry.movie_file, entry.start_time, entry.end_time, entry.trimmed_file
+            if entry.state == "moved":
+                self.state = entry.state
+                return RESUME_STAGES[entry.state]
+            # Files staged by another worker of this host are left to it
+            staged_file = self.trimmed_file if entry.state == "cut" else self.movie_file
+            if entry.state in RESUME_STAGES and self.staging_directory in staged_file.parents and staged_file.is_file():
+                self.state = entry.state
+                return RESUME_STAGES[entry.state]
+
+        # Start over, the staging directory may be in any state
+        self.movie_file = self.start_time = self.end_time = self.trimmed_file = None
+        if self.staging_directory.is_dir():
+            shutil.rmtree(self.staging_directory)
+        return 0
+
+def estimate_minutes(movie_file:Path) -> float:
+    """
+    Returns the length of a recording in minutes from its EIT, or estimated from its size.
+    """
+    duration = EitContent(movie_file).getEitDuration() if movie_file.with_suffix(".eit").is_file() else None
+    if duration:
+        return duration[0] * 60 + duration[1] + duration[2] / 60
+    return movie_file.stat().st_size / PIPELINE_BYTES_PER_MINUTE
+
+def schedule_jobs(jobs:list[RecordingJob], detection_rates:dict[str, float], order:str) -> list[RecordingJob]:
+    """
+    Sorts the jobs by the given order. For 'shortest', the cost of a job is its length times the detection time
+    per minute of its series, series without history are assumed to be as fast as the median series.
+    """
+    if order == "oldest":
+        return sorted(jobs, key=lambda job: job.source_movie_file.stat().st_mtime)
+    if order == "directory":
+        return list(jobs)
+
+    rates = sorted(detection_rates.values())
+    default_rate = rates[len(rates) // 2] if rates else 1.0
+    for job in jobs:
+        job.cost = job.minutes * detection_rates.get(job.series, default_rate)
+    return sorted(jobs, key=lambda job: job.cost)
+
+# Index of the stage continuing a recording in the given journal state, finished recordings are past the last stage
+RESUME_STAGES = {"renamed": 1, "detected": 2, "cut": 3, "moved": 4}
+
+class PipelineStage():
+    """
+    Worker threads taking jobs from a bounded queue. A job is passed on to the next stage if the
+    stage function returns True, a full queue blocks the previous stage.
+    """
+    def __init__(self, name:str, function:Callable[[RecordingJob], bool], workers:int, queue_size:int=PIPELINE_QUEUE_SIZE) -> None:
+        self.name = name
+        self.function = function
+        self.workers = max(1, workers)
+        self.queue:queue.Queue[RecordingJob] = queue.Queue(maxsize=queue_size)
+        self.next_stage:PipelineStage = None
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.max_queue_depth = 0
+        self._queue_depth_sum = 0
+        self._lock = threading.Lock()
+        self._threads:list[threading.Thread] = []
+
+    def start(self) -> None:
+        self._threads = [threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True) for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def put(self, job:RecordingJob) -> None:
+        self.queue.put(job)
+
+    def stop(self) -> None:
+        """Waits until all queued jobs are done."""
+        for _ in self._threads:
+            self.queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self) -> None:
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            with self._lock:
+                depth = self.queue.qsize() + 1
+                self.max_queue_depth = max(self.max_queue_depth, depth)
+                self._queue_depth_sum += depth
+
+            start = time.perf_counter()
+            try:
+                success = self.function(job)
+            except Exception as e:
+                print(f"Error: {self.name} failed for {job.name}: {e}")
+                success = False
+            with self._lock:
+                self.busy_seconds += time.perf_counter() - start
+                if success:
+                    self.processed += 1
+                else:
+                    self.failed += 1
+
+            if success and self.next_stage is not None:
+                self.next_stage.put(job)
+
+    def report(self, elapsed:float) -> str:
+        jobs = self.processed + self.failed
+        per_job = self.busy_seconds / jobs if jobs else 0.0
+        per_hour = self.processed / elapsed * 3600 if elapsed else 0.0
+        mean_depth = self._queue_depth_sum / jobs if jobs else 0.0
+        return (f"{self.name:<8} workers {self.workers}  done {self.processed:>4}  failed {self.failed:>3}  "
+                f"{per_job:8.1f} s/job  {per_hour:7.1f} jobs/h  utilization {self.busy_seconds / (elapsed * self.workers) if elapsed else 0.0:5.0%}  "
+                f"queue mean {mean_depth:.1f} max {self.max_queue_depth}")
+
+def rename_recording(job:RecordingJob, max_continuity_errors:int) -> bool:
+    # stage the recording in its own temporary directory, the source files are never modified,
+    # only the recording is hardlinked as the other files are moved to the output directory
+    job.staging_directory.mkdir(parents=True, exist_ok=True)
+    for file in job.source_files:
+        method = stage_file(file, job.staging_directory/file.name, hardlink=file.name.endswith(".ts"))
+        print(f"Staged {file} to {job.staging_directory/file.name} ({method})")
+    job.record("staged")
+
+    recording_files = [f for f in job.staging_directory.iterdir() if f.is_file()]
+    if not recording_files:
+        print(f"Error: No recordings found in {job.staging_directory}.")
         return False
-    if not template_root_directory.is_dir():
-        print("Error: The template directory does not exist.")
+
+    # Cleanup the recordings, the access points are kept out of it as it deletes them
+    access_points = [f for f in recording_files if f.name.endswith(".ts" + ACCESS_POINTS_SUFFIX)]
+    cleanup_recordings(paths=[f for f in recording_files if f not in access_points], series=True, force_tmdb=True, force_rename=True)
+
+    movie_files = [f for f in job.staging_directory.iterdir() if f.is_file() and f.name.endswith(".ts")]
+    if not movie_files:
+        print(f"Error: No recording left in {job.staging_directory}.")
         return False
-    if not outdir_root_path.is_dir():
-        outdir_root_path.mkdir(parents=True)
+    job.movie_file = movie_files[0]
+    # The detection finds the access points next to the renamed recording
+    if access_points:
+        access_points[0].rename(access_points_path(job.movie_file))
+
+    # Usable access points spare the scan of the whole recording, unless its continuity errors are checked
+    if max_continuity_errors is None and read_access_points(job.movie_file) is not None:
+        job.record("renamed")
+        return True
 
-    for recording_directory in recordings_root_path.iterdir():
+    # Check the recording for transport stream errors before spending time on cutting it,
+    # the index is kept next to the staged copy for the detection
+    index = load_packet_index(job.movie_file, save=True)
+    if index is not None and len(index.error_offsets):
+        print(f"Warning: {job.movie_file.name} has {len(index.error_offsets)} continuity errors.")
+        if max_continuity_errors is not None and len(index.error_offsets) > max_continuity_errors:
+            print(f"Error: Skipping corrupt recording {job.movie_file}.")
+            return False
+    job.record("renamed")
+    return True
+
+def detect_recording(job:RecordingJob, offset:float, movie_length_minutes:float) -> bool:
+    start = time.perf_counter()
+    cut_times = detect_cut_times(video_path=job.movie_file, template_dir=job.template_directory, offset_minutes=offset, movie_length_minutes=movie_length_minutes)
+    # The detection time is the basis of the cost estimate of future recordings of this series
+    if job.journal is not None and job.series and job.minutes:
+        job.journal.record_detection(job.series, job.minutes, time.perf_counter() - start)
+    if cut_times is None:
+        print(f"Error: Could not cut {job.movie_file}.")
+        return False
+    job.start_time, job.end_time = cut_times
+    job.record("detected")
+    return True
+
+def cut_recording(job:RecordingJob) -> bool:
+    job.trimmed_file = trim_video(job.movie_file, job.staging_directory/"trimmed", job.start_time, job.end_time)
+    # delete copy of input movie file
+    job.movie_file.unlink()
+    job.record("cut")
+    return True
+
+def move_recording(job:RecordingJob) -> bool:
+    # move the files to the output directory
+    job.outdir.mkdir(exist_ok=True)
+    for file in [job.trimmed_file] + [f for f in job.staging_directory.iterdir() if f.name.endswith((".eit", ".meta"))]:
+        print(f"Moving {file} to {job.outdir/file.name}")
+        file.rename(job.outdir/file.name)
+    shutil.rmtree(job.staging_directory)
+    job.record("moved")
+    return True
+
+def plan_recording_jobs(recordings_root_path:Path, template_root_directory:Path, outdir_root_path:Path, journal:JobJournal=None, recording_movie_files:list[Path]=None,
+                        staging_suffix:str="") -> tuple[list[RecordingJob], list[Path]]:
+    """
+    Returns the jobs for the recordings in the subdirectories of recordings_root_path (or only the given recording_movie_files)
+    that have templates, and the temporary directories their staging directories are created in.
+    """
+    jobs:list[RecordingJob] = []
+    temporary_directories:list[Path] = []
+    if recording_movie_files is None:
+        recording_directories = list(recordings_root_path.iterdir())
+    else:
+        recording_directories = list(dict.fromkeys(f.parent for f in recording_movie_files))
+    for recording_directory in recording_directories:
         if not recording_directory.is_dir():
             continue
 
@@ -28,59 +262,103 @@ def cleanup_and_autocut(recordings_root_path:Path, template_root_directory:Path,
             continue
 
         # Get all the recordings in the directory
-        recording_movie_files = [f for f in recording_directory.iterdir() if f.is_file() and f.name.endswith(".ts")]
-        if not recording_movie_files:
+        files = [f for f in recording_directory.iterdir() if f.is_file()]
+        directory_movie_files = [f for f in files if f.name.endswith(".ts") and (recording_movie_files is None or f in recording_movie_files)]
+        if not directory_movie_files:
             print(f"No recordings found in {recording_directory.name}.")
             continue
 
-        # Create the output directory
-        outdir = outdir_root_path/recording_directory.name
-        if not outdir.is_dir():
-            outdir.mkdir()
-
-        # Create a temporary output directory
+        # Every recording is staged in its own temporary directory
         temporary_indir = outdir_root_path / f"_autocut_{template_name}"
-        if not temporary_indir.is_dir():
-            temporary_indir.mkdir()
-
-        for recording_movie_file in recording_movie_files:
-            # copy the recordings to the temporary directory   
-            for file in [f for f in recording_directory.iterdir() if f.name.startswith(recording_movie_file.stem)]:
-                if not file.is_file():
-                    continue
-                print(f"Copying {file} to {temporary_indir/file.name}")
-                shutil.copy(file, temporary_indir/file.name)
-
-            recording_files = [f for f in temporary_indir.iterdir() if f.is_file()]
-            if not recording_files:
-                print(f"Error: No recordings found in {temporary_indir.name}.")
-                continue
-
-            # Cleanup the recordings
-            cleanup_recordings(paths=recording_files, series=True, force_tmdb=True, force_rename=True)
-
-            movie_file = [f for f in temporary_indir.iterdir() if f.is_file() and f.name.endswith(".ts")][0]
-            temporary_outdir = temporary_indir / "trimmed"
-
-            # Autocut the recordings
-            success = cut_video(video_path=movie_file, 
-                    template_dir=template_directory,
-                    outdir=temporary_outdir,
-                    offset_minutes=offset,
-                    movie_length_minutes=movie_length_minutes)
-
-            if not success:
-                print(f"Error: Could not cut {movie_file}.")
-                continue
-
-            # move the files to the output directory        
-            for file in list(temporary_outdir.iterdir()) + [f for f in temporary_indir.iterdir() if f.name.endswith((".eit", ".meta"))]:
-                print(f"Moving {file} to {outdir/file.name}")
-                file.rename(outdir/file.name)
-
-            # delete copy of input movie file
-            movie_file.unlink()
-
-        # cleanup the temporary directory
-        print(f"Removing {temporary_indir}")
-        shutil.rmtree(temporary_indir)    
\ No newline at end of file
+        temporary_directories.append(temporary_indir)
+        name_index = PathNameIndex(files)
+        for recording_movie_file in directory_movie_files:
+            jobs.append(RecordingJob(source_movie_file=recording_movie_file,
+                                     source_files=name_index.startswith(recording_movie_file.stem),
+                                     template_directory=template_directory,
+                                     outdir=outdir_root_path/recording_directory.name,
+                                     staging_directory=temporary_indir/(recording_movie_file.stem + staging_suffix),
+                                     journal=journal,
+                                     series=recording_directory.name))
+
+    return jobs, temporary_directories
+
+def cleanup_and_autocut(recordings_root_path:Path, template_root_directory:Path, outdir_root_path:Path, offset:float=0, movie_length_minutes:float=None, max_continuity_errors:int=None, offline:bool=False,
+                        detect_workers:int=PIPELINE_DETECT_WORKERS, cut_workers:int=PIPELINE_CUT_WORKERS, restart:bool=False, recording_movie_files:list[Path]=None,
+                        order:str="shortest"):
+    """
+    Renames and cuts the recordings in the subdirectories of recordings_root_path, or only the given recording_movie_files.
+    New recordings are processed in the given order (see PIPELINE_ORDERS), by default the cheapest first.
+    """
+    # Check if the directories exist
+    if not recordings_root_path.is_dir():
+        print("Error: The recordings root path does not exist.")
+        return False
+    if not template_root_directory.is_dir():
+        print("Error: The template directory does not exist.")
+        return False
+    if not outdir_root_path.is_dir():
+        outdir_root_path.mkdir(parents=True)
+
+    snapshot = None
+    if offline:
+        snapshot = load_snapshot()
+        if snapshot is None:
+            print(f"Error: No TMDB snapshot found at {get_snapshot_path()}. Please run snapshot-tmdb first.")
+            return False
+
+    # Recordings are resumed at their last completed stage, unless a restart is requested
+    journal = JobJournal(outdir_root_path/PIPELINE_JOURNAL_FILENAME)
+
+    jobs, temporary_directories = plan_recording_jobs(recordings_root_path, template_root_directory, outdir_root_path, journal, recording_movie_files)
+
+    # rename -> detect -> cut -> move, the detection of a recording overlaps the cutting and moving of the previous ones
+    stages = [PipelineStage("rename", lambda job: rename_recording(job, max_continuity_errors), PIPELINE_RENAME_WORKERS),
+              PipelineStage("detect", lambda job: detect_recording(job, offset, movie_length_minutes), detect_workers),
+              PipelineStage("cut", cut_recording, cut_workers),
+              PipelineStage("move", move_recording, PIPELINE_MOVE_WORKERS)]
+    for stage, next_stage in zip(stages, stages[1:]):
+        stage.next_stage = next_stage
+
+    if restart:
+        for job in jobs:
+            journal.remove(job.source_movie_file)
+
+    # Finished recordings are skipped, the others continue at the stage after their last completed one
+    resumed_jobs:list[tuple[int, RecordingJob]] = []
+    for job in schedule_jobs(jobs, journal.detection_rates(), order):
+        stage_index = job.resume()
+        if stage_index == len(stages):
+            print(f"Skipping finished recording {job.source_movie_file}")
+        else:
+            if stage_index:
+                print(f"Resuming {job.source_movie_file} after stage '{job.state}'")
+            resumed_jobs.append((stage_index, job))
+    # Jobs closest to completion first, they free their staging space soonest, the sort keeps the schedule otherwise
+    resumed_jobs.sort(key=lambda item: -item[0])
+
+    start = time.perf_counter()
+    with use_snapshot(snapshot) if snapshot is not None else nullcontext():
+        for stage in stages:
+            stage.start()
+        for stage_index, job in resumed_jobs:
+            stages[stage_index].put(job)
+        for stage in stages:
+            stage.stop()
+    elapsed = time.perf_counter() - start
+
+    # Failed recordings start over in the next run, their staging directories are removed below
+    for _, job in resumed_jobs:
+        if job.state != "moved":
+            journal.remove(job.source_movie_file)
+
+    # cleanup the temporary directories
+    for temporary_indir in temporary_directories:
+        if temporary_indir.is_dir():
+            print(f"Removing {temporary_indir}")
+            shutil.rmtree(temporary_indir)
+
+    print(f"Processed {stages[-1].processed} of {len(resumed_jobs)} recordings in {elapsed:.1f} s, {len(jobs) - len(resumed_jobs)} were already finished")
+    for stage in stages:
+        print(stage.report(elapsed))
+    return stages[-1].processed == len(resumed_jobs)
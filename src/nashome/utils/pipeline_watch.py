@@ -0,0 +1,90 @@
+"""
+Watch mode of pipeline-autocut: recordings are cut as soon as they are finished instead of in a nightly batch.
+"""
+from pathlib import Path
+import time
+
+from nashome.utils.constants import PIPELINE_SETTLE_SECONDS, PIPELINE_POLL_SECONDS, PIPELINE_JOURNAL_FILENAME, PIPELINE_MAX_ATTEMPTS
+from nashome.utils.journal import JobJournal
+from nashome.utils.pipeline import cleanup_and_autocut
+from nashome.utils.watcher import create_watcher
+
+def watch_and_autocut(recordings_root_path:Path, outdir_root_path:Path, settle_seconds:float=PIPELINE_SETTLE_SECONDS, poll_seconds:float=PIPELINE_POLL_SECONDS, **options) -> None:
+    """
+    Runs cleanup_and_autocut for every recording in the subdirectories of recordings_root_path as soon as it is finished,
+    i.e. its .ts file has not grown for settle_seconds and its .eit file exists. Runs until interrupted.
+
+    A recording that failed is retried after settle_seconds, up to PIPELINE_MAX_ATTEMPTS times. Recordings moved to
+    outdir_root_path, or given up on, are only taken again if they change.
+    """
+    if not recordings_root_path.is_dir():
+        print("Error: The recordings root path does not exist.")
+        return
+
+    watcher = create_watcher(recordings_root_path, poll_seconds)
+    print(f"Watching {recordings_root_path} ({type(watcher).__name__}), recordings are cut {settle_seconds:.0f} s after they stopped growing")
+
+    # The journal of cleanup_and_autocut knows the moved recordings, an entry of a changed recording is void
+    journal = JobJournal(outdir_root_path/PIPELINE_JOURNAL_FILENAME)
+    # Recordings waiting to be finished: movie file -> (size, time of the last size change)
+    pending:dict[Path, tuple[int, float]] = {}
+    # Recordings that failed: movie file -> ((size, mtime), failed attempts), only kept while they exist
+    failures:dict[Path, tuple[tuple[int, int], int]] = {}
+    try:
+        while True:
+            for path in watcher.wait(poll_seconds):
+                if path.suffix != ".ts" or path.parent.parent != recordings_root_path or path in pending:
+                    continue
+                try:
+                    stat = path.stat()
+                    entry = journal.get(path)
+                except FileNotFoundError:
+                    continue
+                if entry is not None and entry.state == "moved":
+                    continue
+                version, attempts = failures.get(path, (None, 0))
+                if version != (stat.st_size, stat.st_mtime_ns) or attempts < PIPELINE_MAX_ATTEMPTS:
+                    pending[path] = (-1, time.monotonic())
+
+            finished = []
+            now = time.monotonic()
+            for path, (size, since) in list(pending.items()):
+                try:
+                    current_size = path.stat().st_size
+                except FileNotFoundError:
+                    del pending[path]
+                    continue
+                if current_size != size:
+                    pending[path] = (current_size, now)
+                elif now - since >= settle_seconds and path.with_suffix(".eit").is_file():
+                    finished.append(path)
+                    del pending[path]
+
+            if not finished:
+                continue
+            print(f"{len(finished)} recordings finished, {len(pending)} still pending")
+            cleanup_and_autocut(recordings_root_path=recordings_root_path, outdir_root_path=outdir_root_path, recording_movie_files=finished, **options)
+
+            for path in [path for path in failures if not path.exists()]:
+                del failures[path]
+            for path in finished:
+                try:
+                    stat = path.stat()
+                    entry = journal.get(path)
+                except FileNotFoundError:
+                    continue
+                if entry is not None and entry.state == "moved":
+                    failures.pop(path, None)
+                    continue
+                version, attempts = failures.get(path, (None, 0))
+                attempts = attempts + 1 if version == (stat.st_size, stat.st_mtime_ns) else 1
+                failures[path] = ((stat.st_size, stat.st_mtime_ns), attempts)
+                if attempts < PIPELINE_MAX_ATTEMPTS:
+                    print(f"Failed to process {path} (attempt {attempts}), retrying in {settle_seconds:.0f} s")
+                    pending[path] = (stat.st_size, time.monotonic())
+                else:
+                    print(f"Failed to process {path} {attempts} times, it is taken again when it changes")
+    except KeyboardInterrupt:
+        print("Stopped watching")
+    finally:
+        watcher.close()
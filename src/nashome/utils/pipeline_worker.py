@@ -0,0 +1,144 @@
+"""
+Worker mode of pipeline-autocut: several machines process the recordings of a shared work queue.
+
+The queue lives on the shared output directory (see nashome.utils.work_queue), every worker claims
+one recording at a time and runs the pipeline stages on it in a staging directory of its own.
+"""
+from contextlib import nullcontext
+import os
+from pathlib import Path
+import shutil
+import socket
+import time
+
+from nashome.tmdb.client import use_snapshot
+from nashome.tmdb.snapshot import get_snapshot_path, load_snapshot
+from nashome.utils.cache import get_cache_dir
+from nashome.utils.constants import PIPELINE_POLL_SECONDS, PIPELINE_WORK_QUEUE_FILENAME, PIPELINE_LEASE_SECONDS, PIPELINE_MAX_ATTEMPTS, PIPELINE_WORKER_JOURNAL_FILENAME, PIPELINE_STAGING_GRACE_SECONDS
+from nashome.utils.journal import JobJournal
+from nashome.utils.pipeline import cut_recording, detect_recording, move_recording, plan_recording_jobs, rename_recording, schedule_jobs
+from nashome.utils.work_queue import LeaseKeeper, WorkQueue
+
+def get_worker_journal_path() -> Path:
+    """
+    Returns the journal of the workers on this host. It stays on local disk, as its WAL does not work on the shared
+    output directory, and keeps the detection history and the stages of the recordings processed on this host.
+    """
+    return get_cache_dir() / PIPELINE_WORKER_JOURNAL_FILENAME.format(host=socket.gethostname())
+
+def remove_stale_directory(directory:Path, max_age:float) -> bool:
+    """
+    Removes the staging directory of another worker if none of its files changed for max_age seconds. A worker that
+    only failed to renew its lease may still be writing to a younger one, it is left to that worker.
+    """
+    try:
+        if not directory.is_dir():
+            return False
+        age = time.time() - max(path.stat().st_mtime for path in [directory, *directory.rglob("*")])
+    except OSError:
+        return False
+    if age < max_age:
+        print(f"Keeping {directory}, it changed {age:.0f} s ago")
+        return False
+    print(f"Removing stale {directory}")
+    shutil.rmtree(directory, ignore_errors=True)
+    return True
+
+def enqueue_recordings(recordings_root_path:Path, template_root_directory:Path, outdir_root_path:Path) -> bool:
+    """
+    Adds all recordings to the work queue on the shared output directory, see run_autocut_worker.
+    Recordings are stored relative to recordings_root_path, every machine may mount the share elsewhere.
+    """
+    if not recordings_root_path.is_dir() or not template_root_directory.is_dir():
+        print("Error: The recordings root path or the template directory does not exist.")
+        return False
+    outdir_root_path.mkdir(parents=True, exist_ok=True)
+
+    # Costs are estimated from the detection history of the workers on this host
+    journal = JobJournal(get_worker_journal_path())
+    jobs, _ = plan_recording_jobs(recordings_root_path, template_root_directory, outdir_root_path)
+    jobs = schedule_jobs(jobs, journal.detection_rates(), "shortest")
+
+    work_queue = WorkQueue(outdir_root_path/PIPELINE_WORK_QUEUE_FILENAME, PIPELINE_MAX_ATTEMPTS)
+    added = work_queue.enqueue([(job.source_movie_file.relative_to(recordings_root_path), job.series, job.cost) for job in jobs])
+    print(f"Queued {added} new of {len(jobs)} recordings: {work_queue.counts()}")
+    return True
+
+def run_autocut_worker(recordings_root_path:Path, template_root_directory:Path, outdir_root_path:Path, worker_id:str=None, offset:float=0, movie_length_minutes:float=None,
+                       max_continuity_errors:int=None, offline:bool=False, lease_seconds:float=PIPELINE_LEASE_SECONDS) -> bool:
+    """
+    Claims recordings from the work queue on the shared output directory and processes them one by one until all are done.
+    Several workers on different machines (with synchronized clocks) may run against the same queue.
+
+    A recording is staged in a directory of its own worker. The results are only moved to the output directory if the
+    worker still holds the lease and marked the recording as moving in the queue, so a recording reclaimed from a slow
+    or crashed worker is never delivered twice.
+    Every worker journals its recordings on this host (see get_worker_journal_path), a worker restarted with the same
+    worker_id resumes a reclaimed recording at its last completed stage.
+    """
+    work_queue = WorkQueue(outdir_root_path/PIPELINE_WORK_QUEUE_FILENAME, PIPELINE_MAX_ATTEMPTS)
+    journal = JobJournal(get_worker_journal_path())
+    worker = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+
+    snapshot = None
+    if offline:
+        snapshot = load_snapshot()
+        if snapshot is None:
+            print(f"Error: No TMDB snapshot found at {get_snapshot_path()}. Please run snapshot-tmdb first.")
+            return False
+
+    processed = failed = 0
+    with use_snapshot(snapshot) if snapshot is not None else nullcontext():
+        while True:
+            item = work_queue.claim(worker, lease_seconds)
+            if item is None:
+                # Recordings leased to other workers come back if those crash, so wait until they are done
+                counts = work_queue.counts()
+                if not counts.get('claimed') and not counts.get('moving') and not counts.get('expired'):
+                    break
+                time.sleep(min(lease_seconds / 3, PIPELINE_POLL_SECONDS))
+                continue
+            print(f"Worker {worker}: claimed {item.source} (attempt {item.attempts})")
+            jobs, _ = plan_recording_jobs(recordings_root_path, template_root_directory, outdir_root_path, journal,
+                                          recording_movie_files=[recordings_root_path/item.source], staging_suffix=f".{worker}")
+            success = False
+            if jobs:
+                job = jobs[0]
+                # The staging directory of a crashed worker is not needed anymore
+                if item.previous_worker and item.previous_worker != worker:
+                    remove_stale_directory(job.staging_directory.with_name(f"{job.source_movie_file.stem}.{item.previous_worker}"),
+                                           lease_seconds + PIPELINE_STAGING_GRACE_SECONDS)
+
+                # rename -> detect -> cut, continued after the last stage this worker completed
+                stage_index = job.resume()
+                stages = [lambda: rename_recording(job, max_continuity_errors),
+                          lambda: detect_recording(job, offset, movie_length_minutes),
+                          lambda: cut_recording(job)]
+                if stage_index:
+                    print(f"Worker {worker}: resuming {job.name} after stage '{job.state}'")
+
+                with LeaseKeeper(work_queue, item.source, worker, lease_seconds) as lease:
+                    try:
+                        success = all(stage() for stage in stages[stage_index:])
+                        # A recording moved before a crash is done, it must not be delivered twice
+                        if job.state == "moved":
+                            success = True
+                        elif success and not lease.lost and work_queue.start_moving(item.source, worker, (job.outdir/job.trimmed_file.name).relative_to(outdir_root_path),
+                                                                                    lease_seconds):
+                            success = move_recording(job)
+                        elif success:
+                            print(f"Warning: Worker {worker} lost the lease of {job.name}, discarding its results.")
+                            success = False
+                    except Exception as e:
+                        print(f"Error: Worker {worker} failed for {job.name}: {e}")
+                        success = False
+
+                if job.staging_directory.is_dir():
+                    shutil.rmtree(job.staging_directory)
+
+            work_queue.complete(item.source, worker, success)
+            processed += success
+            failed += not success
+
+    print(f"Worker {worker}: {processed} recordings processed, {failed} failed, queue: {work_queue.counts()}")
+    return failed == 0
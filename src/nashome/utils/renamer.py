@@ -1,12 +1,17 @@
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import re
-import requests
-from unidecode import unidecode
 
-from nashome.config.config import tmdb_api_token
-from nashome.utils.constants import SERIES_LIST
-from nashome.utils.eit import EitContent
-from nashome.utils.series import Series
+from nashome.tmdb.client import get_episode, get_series, use_snapshot
+from nashome.tmdb.index import get_episode_index
+from nashome.tmdb.snapshot import get_snapshot_path, load_snapshot
+from nashome.utils.constants import SERIES_LIST, TMDB_MAX_CONNECTIONS, TS_INDEX_SUFFIX
+from nashome.utils.eit import EitContent, read_eit_records
+from nashome.utils.normalize import filter_string, replace_forbidden_characters
+from nashome.utils.series import Series, SeriesRegistry
+
+REGEX_EPISODE_NUMBER = re.compile(r"^.*([0-9]+)\. Staffel, Folge ([0-9]+).*")
 
 def build_filename_from_title(title:str, suffix:str, language_code:str, try_all_seasons:bool) -> tuple[str, str]:
     if suffix.startswith('.'):
@@ -23,9 +28,7 @@ def build_filestem_from_eitfile(eit_path:str|Path, force_tmdb:bool, series:bool)
     if name and not series:
         return name, None
 
-    regex_episode_number = re.compile(r"^.*([0-9]+)\. Staffel, Folge ([0-9]+).*")
-    
-    match_episode_number = regex_episode_number.match(eit_content.getEitDescription())
+    match_episode_number = REGEX_EPISODE_NUMBER.match(eit_content.getEitDescription())
     if not force_tmdb and match_episode_number is not None: 
         season = int(match_episode_number.group(1))
         episode = int(match_episode_number.group(2))
@@ -63,142 +66,173 @@ def build_filestem(original_title:str, episode_name:str, language_code:str, try_
 
     return replace_forbidden_characters(original_title), episode_name
 
-def get_season_id(title:str) -> int:
+def get_season_id(title:str, verbose:bool=True) -> int:
     regex_list_season = [re.compile(r".*s(\d+)e\d+.*"), re.compile(r".*staffel (\d+).*"), re.compile(r".*season (\d+).*")]
     for regex in regex_list_season:
         match = regex.match(title.lower())
         if match:
-            print(f"Found season id {int(match.group(1))}.")
+            if verbose:
+                print(f"Found season id {int(match.group(1))}.")
             return int(match.group(1))
     return 0
 
-def replace_forbidden_characters(string:str) -> str:
-    keyword_replace = {
-        "/" : "-",
-        ":" : "",
-        "?" : "",
-        "*" : "",
-        '"' : "",
-        "'" : "",
-        "<" : "-",
-        ">" : "-",
-        "|" : "-",
-        "\\" : "-"
-    }
-
-    for key, value in keyword_replace.items():
-        string = string.replace(key, value)
-    
-    return string
-
-def filter_string(string:str|bytes) -> str:
-    if isinstance(string, bytes):
-        string = string.decode('utf-8', 'ignore')
-
-    keyword_replace = {
-        r"_" : "",
-        r"\'" : "",
-        r"\." : "",
-        r"\!": "",
-        r"\?" : "",
-        r"\-" : " ",
-        r"\," : " ",
-        r"\:" : "",
-        r'"' : "",
-        r"'" : "",
-        r"versus" : "vs",
-        r"\&" : "and",
-        r"\s+": ""
-    }
-
-    filtered_string = unidecode(string.lower())
-    for key, value in keyword_replace.items():
-        filtered_string = re.sub(key, value, filtered_string)
-
-    return filtered_string.strip()
+def get_season_list(series_id:int, season_id:int, language_code:str) -> list[int]:
+    if season_id:
+        return [season_id]
+    series = get_series(series_id, language_code)
+    # An unknown series (or one missing from the offline snapshot) has no seasons, the title is kept
+    if "number_of_seasons" not in series:
+        print(f"TMDB: could not find series {series_id}: {series.get('status_message')}")
+        return []
+    num_seasons = series["number_of_seasons"]
+    print(f"TMDB: found series '{series['name']}' with {num_seasons} seasons.")
+    return list(range(1, num_seasons+1))
 
 def find_episode_and_season(title:str, series_id:int, season_id:int, language_code:str) -> tuple[int, int, str]:
-    headers = {
-        "accept": "application/json",
-        "Authorization": f"Bearer {tmdb_api_token}"
-    }
-    
-    if season_id:
-        season_list = [season_id]
-    else:
-        url = f"https://api.themoviedb.org/3/tv/{series_id}?language={language_code}"
-
-        response = requests.get(url, headers=headers)
-        num_seasons = response.json()["number_of_seasons"]
-        print(f"TMDB: found series '{response.json()['name']}' with {num_seasons} seasons.")
-        season_list = list(range(1, num_seasons+1))
-
-    for season in season_list:
-        url = f"https://api.themoviedb.org/3/tv/{series_id}/season/{season}?language={language_code}"
-        response = requests.get(url, headers=headers)
-        for episode in response.json()['episodes']:
-            tmdb_episode_name = filter_string(episode['name'])
-            title = filter_string(title)
-            if not tmdb_episode_name or not title:
-                continue
-            if tmdb_episode_name in title or title in tmdb_episode_name:
-                episode_name = episode['name']
-                print(f"TMDB: found episode '{episode_name}' as s{season:02}e{episode['episode_number']:03d}.")
-                if not language_code == 'de-DE':
-                    episode_name = find_episode_name(series_id, season, episode['episode_number'], "de-DE")
-                return episode['episode_number'], episode['season_number'], episode_name
+    season_list = get_season_list(series_id, season_id, language_code)
+
+    episode = get_episode_index(series_id, season_list, language_code, filter_string).find(title)
+    if episode is not None:
+        season = episode['season_number']
+        episode_name = episode['name']
+        print(f"TMDB: found episode '{episode_name}' as s{season:02}e{episode['episode_number']:03d}.")
+        if not language_code == 'de-DE':
+            episode_name = find_episode_name(series_id, season, episode['episode_number'], "de-DE") or episode_name
+        return episode['episode_number'], season, episode_name
     return None, None, None
 
 def find_episode_name(series_id:int, season_id:int, episode_id:int, language_code:str="de-DE") -> str:
-    url = f"https://api.themoviedb.org/3/tv/{series_id}/season/{season_id}/episode/{episode_id}?language={language_code}"
+    return get_episode(series_id, season_id, episode_id, language_code).get("name")
 
-    headers = {
-        "accept": "application/json",
-        "Authorization": f"Bearer {tmdb_api_token}",
-        "Cache-Control": "no-cache"
-    }
-    response = requests.get(url, headers=headers)
-    return response.json()["name"]
+_series_registry:SeriesRegistry = None
 
 def find_series(title:str) -> Series:
-    for series in SERIES_LIST:
-        if filter_string(series.name) in filter_string(title):
-            return series
-    return None
+    global _series_registry
+    if _series_registry is None:
+        _series_registry = SeriesRegistry(SERIES_LIST, filter_string)
+    return _series_registry.find(title)
+
+def find_tmdb_lookup(original_title:str, language_code:str, try_all_seasons:bool) -> tuple[int, int, str]:
+    """
+    Returns the (series id, season id, language code) that build_filestem will look up for a title, or None.
+    """
+    series = find_series(original_title)
+    if not series:
+        return None
+    season_id = 0 if try_all_seasons else get_season_id(original_title, verbose=False)
+    return series.series_id, season_id, language_code
+
+def find_tmdb_lookup_from_eitfile(eit_path:str|Path, force_tmdb:bool, series:bool) -> tuple[int, int, str]:
+    """
+    Returns the (series id, season id, language code) that build_filestem_from_eitfile will look up, or None.
+    """
+    eit_content = EitContent(eit_path)
+    name = replace_forbidden_characters(eit_content.getEitName())
+    if (name and not series) or (not force_tmdb and REGEX_EPISODE_NUMBER.match(eit_content.getEitDescription())):
+        return None
+    return find_tmdb_lookup(name, 'de-DE', True)
+
+def prefetch_episode_indices(lookups:set[tuple[int, int, str]], jobs:int=TMDB_MAX_CONNECTIONS) -> None:
+    """
+    Builds the episode indices for all lookups concurrently. Every TMDB document is fetched once,
+    later lookups of the same series are then resolved in memory.
+    """
+    def prefetch(lookup:tuple[int, int, str]) -> None:
+        series_id, season_id, language_code = lookup
+        try:
+            get_episode_index(series_id, get_season_list(series_id, season_id, language_code), language_code, filter_string)
+        except Exception as e:
+            print(f"TMDB: could not prefetch series {series_id}: {e}")
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        list(executor.map(prefetch, lookups))
+
+class PathNameIndex():
+    """
+    Paths sorted by file name, to find all paths whose name starts with a prefix without scanning all of them.
+    """
+    def __init__(self, paths:list[Path]) -> None:
+        # Matches are returned in input order, as the plain scan over paths did
+        entries = sorted((path.name, position) for position, path in enumerate(paths))
+        self.paths = paths
+        self.names = [name for name, _ in entries]
+        self.positions = [position for _, position in entries]
+
+    def startswith(self, prefix:str, suffixes:tuple[str]=None) -> list[Path]:
+        positions = []
+        i = bisect_left(self.names, prefix)
+        while i < len(self.names) and self.names[i].startswith(prefix):
+            if suffixes is None or self.names[i].endswith(suffixes):
+                positions.append(self.positions[i])
+            i += 1
+        return [self.paths[position] for position in sorted(positions)]
+
+def cleanup_recordings(paths:list[Path], series:bool, force_tmdb:bool, force_rename:bool, dash:bool=False, no_tmdb:bool=False, language_code:str='de-DE', try_all_seasons:bool=False, jobs:int=TMDB_MAX_CONNECTIONS, offline:bool=False) -> bool:
+    if offline and not no_tmdb:
+        # Resolve exclusively from the local TMDB snapshot, see snapshot-tmdb
+        snapshot = load_snapshot()
+        if snapshot is None:
+            print(f"Error: No TMDB snapshot found at {get_snapshot_path()}. Please run snapshot-tmdb first.")
+            return False
+        with use_snapshot(snapshot):
+            return cleanup_recordings(paths=paths, series=series, force_tmdb=force_tmdb, force_rename=force_rename, dash=dash, no_tmdb=no_tmdb,
+                                      language_code=language_code, try_all_seasons=try_all_seasons, jobs=jobs)
 
-def cleanup_recordings(paths:list[Path], series:bool, force_tmdb:bool, force_rename:bool, dash:bool=False, no_tmdb:bool=False, language_code:str='de-DE', try_all_seasons:bool=False) -> bool:
     extensions = ('.eit', '.ts', '.meta', '.jpg', '.txt')
-    remove_extensions = ('.ap', '.cuts', '.sc', 'idx2')
+    remove_extensions = ('.ap', '.cuts', '.sc', 'idx2', TS_INDEX_SUFFIX)
     
     remove_list:list[Path] = []
     rename_dict:dict[Path, Path] = {}
     touch_oldname_list:list[Path] = []
+
+    # Parse all EIT files and classify all inputs by series up front,
+    # the renaming below is then served from the EIT cache and the in-memory TMDB documents
+    if not no_tmdb:
+        read_eit_records([p for p in paths if p.name.endswith('eit')])
+        lookups = set()
+        for path in paths:
+            if path.name.endswith(remove_extensions):
+                continue
+            if path.name.endswith('eit'):
+                lookups.add(find_tmdb_lookup_from_eitfile(path, force_tmdb, series))
+            elif path.name.endswith(('.mp4', '.mkv')):
+                lookups.add(find_tmdb_lookup(path.name, language_code, try_all_seasons))
+        lookups.discard(None)
+        if lookups:
+            prefetch_episode_indices(lookups, jobs)
     
-    for path in paths:
-        root = path.parent
+    def resolve_filestem(path:Path) -> str:
         filename = path.name
-        
         if filename.endswith(remove_extensions):
-            remove_list.append(path)
-        elif filename.endswith('eit'):
-            if no_tmdb:
-                newstem,_ = build_filestem_from_oldname(filename, dash, series)
-            else:
-                newstem,_ = build_filestem_from_eitfile(path, force_tmdb, series)
-            basename = path.stem
-            
-            for oldpath in [p for p in paths if p.name.startswith(basename) and p.name.endswith(extensions)]:
-                suffix = "".join(oldpath.suffixes)
-                newpath = root/(newstem + suffix)
-                rename_dict[oldpath] = newpath
-                if not series and suffix == '.ts':
-                    touch_oldname_list.append(oldpath)
-        elif filename.endswith(('.mp4', '.mkv')):
-            if no_tmdb:
-                newstem,_ = build_filestem_from_oldname(filename, dash, series)
-            else:
-                newstem,_ = build_filename_from_title(filename, path.suffix, language_code, try_all_seasons)
-            rename_dict[path] = root / newstem
+            return None
+        if no_tmdb and filename.endswith(('eit', '.mp4', '.mkv')):
+            return build_filestem_from_oldname(filename, dash, series)[0]
+        if filename.endswith('eit'):
+            return build_filestem_from_eitfile(path, force_tmdb, series)[0]
+        if filename.endswith(('.mp4', '.mkv')):
+            return build_filename_from_title(filename, path.suffix, language_code, try_all_seasons)[0]
+        return None
+
+    # Resolve the new names of all recordings in a bounded pool, results are taken into the plan in input order
+    name_index = PathNameIndex(paths)
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        for path, newstem in zip(paths, executor.map(resolve_filestem, paths)):
+            root = path.parent
+            filename = path.name
+
+            if filename.endswith(remove_extensions):
+                remove_list.append(path)
+            elif filename.endswith('eit'):
+                basename = path.stem
+
+                for oldpath in name_index.startswith(basename, extensions):
+                    suffix = "".join(oldpath.suffixes)
+                    newpath = root/(newstem + suffix)
+                    rename_dict[oldpath] = newpath
+                    if not series and suffix == '.ts':
+                        touch_oldname_list.append(oldpath)
+            elif filename.endswith(('.mp4', '.mkv')):
+                rename_dict[path] = root / newstem
     
     if len(remove_list)==0 and len(rename_dict)==0:
         print("Nothing to do")
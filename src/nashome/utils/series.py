@@ -1,10 +1,14 @@
+import json
 import re
+from pathlib import Path
+from typing import Callable
 
 class Series():
     def __init__(self, name:str, series_id:int, *regex:tuple[str,...]) -> None:
         self.name = name
         self.series_id = series_id
         self.regex = regex if regex else [r"(.*)"]
+        self.compiled_regex = [re.compile(r) for r in self.regex]
 
     def __str__(self):
         return self.name
@@ -16,9 +20,46 @@ class Series():
         return self.name == str(other)
     
     def build_episode_name(self, title:str) -> str:
-        for regex in self.regex:
-            episode_match = re.match(regex, title)
+        for regex in self.compiled_regex:
+            episode_match = regex.match(title)
             if episode_match is not None:
-                return re.match(regex, title).group(1).strip()
+                return episode_match.group(1).strip()
         
-        return title.strip()
\ No newline at end of file
+        return title.strip()
+
+def load_series_list(path:str|Path) -> list[Series]:
+    """
+    Loads the series list from a JSON file with entries of the form
+    {"name": "Pokemon", "id": <TMDB series id>, "regex": [<episode name regex>, ...]}.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return [Series(entry['name'], entry['id'], *entry.get('regex', [])) for entry in json.load(f)]
+
+class SeriesRegistry():
+    """
+    Finds the series of a title in a single pass over the normalized title.
+
+    All normalized series names are combined into one regex. Each series name found in the
+    title is a candidate, the longest one wins, so 'Pokemon Horizonte' beats 'Pokemon'.
+    """
+    def __init__(self, series_list:list[Series], normalize:Callable[[str], str]) -> None:
+        self.normalize = normalize
+        self.series:dict[str, Series] = {}
+        for series in series_list:
+            name = normalize(series.name)
+            if name and name not in self.series:
+                self.series[name] = series
+
+        # Lookahead to find overlapping names, longer names first to get the longest one per position
+        names = sorted(self.series, key=len, reverse=True)
+        self.regex = re.compile("(?=(" + "|".join(re.escape(name) for name in names) + "))") if names else None
+
+    def find(self, title:str) -> Series:
+        if self.regex is None:
+            return None
+        best_name = None
+        for match in self.regex.finditer(self.normalize(title)):
+            name = match.group(1)
+            if best_name is None or len(name) > len(best_name):
+                best_name = name
+        return self.series[best_name] if best_name else None
@@ -0,0 +1,35 @@
+"""
+Per-thread connections to a SQLite database file.
+
+sqlite3 connections must not be shared between threads, so every thread gets a connection of its
+own. Each new connection runs the setup statements of its database (pragmas and schema) first.
+"""
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable
+
+class ThreadConnections():
+    def __init__(self, path:Path, statements:tuple[str, ...], timeout:float=30, isolation_level:str="", on_connect:Callable[[sqlite3.Connection], None]=None) -> None:
+        self.path = Path(path)
+        self.statements = statements
+        self.timeout = timeout
+        # None for explicitly controlled transactions
+        self.isolation_level = isolation_level
+        self.on_connect = on_connect
+        self._local = threading.local()
+
+    def get(self) -> sqlite3.Connection:
+        """Returns the connection of the calling thread, the database directory is created on first use."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=self.isolation_level)
+            for statement in self.statements:
+                connection.execute(statement)
+            if connection.in_transaction:
+                connection.commit()
+            self._local.connection = connection
+            if self.on_connect is not None:
+                self.on_connect(connection)
+        return connection
@@ -0,0 +1,71 @@
+"""
+Staging of recordings into a working directory without copying their data where possible.
+
+A file is staged as a hardlink if source and target are on the same filesystem, as a reflink
+(FICLONE) or kernel side copy (copy_file_range) if the filesystem supports it, and as a plain
+byte copy otherwise. The pipeline only renames, reads and unlinks staged files, so the source
+files stay untouched in every case.
+
+Hardlinks are only used for files that never leave the staging directory (the recording itself,
+which is replaced by its trimmed copy). Files delivered to the output directory must not share
+their inode with the source, a later edit of one would change the other.
+"""
+import errno
+import fcntl
+import os
+import shutil
+from pathlib import Path
+
+# _IOW(0x94, 9, int) from linux/fs.h
+FICLONE = 0x40049409
+
+# Errors meaning the method is not available for this pair of files, the next one is tried
+UNSUPPORTED_ERRORS = (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP, errno.EOPNOTSUPP, errno.EINVAL, errno.ENOSYS, errno.ENOTTY)
+
+COPY_CHUNK_SIZE = 1 << 30
+
+def _reflink(source:Path, target:Path) -> None:
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+def _copy_file_range(source:Path, target:Path) -> None:
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        remaining = os.fstat(src.fileno()).st_size
+        while remaining > 0:
+            copied = os.copy_file_range(src.fileno(), dst.fileno(), min(remaining, COPY_CHUNK_SIZE))
+            if copied == 0:
+                break
+            remaining -= copied
+        if remaining > 0:
+            raise OSError(errno.EINVAL, "copy_file_range stopped early", str(source))
+
+def stage_file(source:Path, target:Path, hardlink:bool=True) -> str:
+    """
+    Makes source available at target without modifying source, returns the used method:
+    'hardlink' (only if hardlink is set), 'reflink', 'copy_file_range' or 'copy'.
+    """
+    if target.exists():
+        target.unlink()
+
+    if hardlink:
+        try:
+            os.link(source, target)
+            return "hardlink"
+        except OSError as e:
+            if e.errno not in UNSUPPORTED_ERRORS:
+                raise
+
+    for method, copy in (("reflink", _reflink), ("copy_file_range", _copy_file_range)):
+        if method == "copy_file_range" and not hasattr(os, "copy_file_range"):
+            continue
+        try:
+            copy(source, target)
+            shutil.copymode(source, target)
+            return method
+        except OSError as e:
+            target.unlink(missing_ok=True)
+            if e.errno not in UNSUPPORTED_ERRORS:
+                raise
+
+    shutil.copy(source, target)
+    return "copy"
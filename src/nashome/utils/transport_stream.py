@@ -0,0 +1,480 @@
+"""
+Minimal MPEG transport stream reader.
+
+The stream is memory-mapped and viewed as a NumPy array of 188-byte packets, so
+only the pages that are actually inspected are read from disk.
+"""
+import mmap
+import numpy as np
+from pathlib import Path
+from typing import Iterator
+
+from nashome.utils.constants import TS_INDEX_SUFFIX
+
+TS_PACKET_SIZE = 188
+TS_SYNC_BYTE = 0x47
+
+PAT_PID = 0x0000
+EIT_PID = 0x0012
+NULL_PID = 0x1FFF
+
+PAT_TABLE_ID = 0x00
+PMT_TABLE_ID = 0x02
+EIT_ACTUAL_PRESENT_FOLLOWING_TABLE_ID = 0x4E
+
+# MPEG-1/2, H.264 and HEVC video
+VIDEO_STREAM_TYPES = (0x01, 0x02, 0x1B, 0x24)
+
+PTS_CLOCK = 90000
+PTS_WRAP = 1 << 33
+
+# Packets processed at once when indexing a whole recording (~48 MB)
+INDEX_CHUNK_PACKETS = 1 << 18
+
+# EIT present/following is repeated at least every 2 seconds, a few MB of stream are enough
+EIT_SCAN_SIZE = 8 * 1024 * 1024
+
+# The start of the stream is the smallest PTS of its first PES packets, B-frames precede their reference frame
+START_PTS_PES_COUNT = 16
+
+# Enigma2 access point file next to a recording (<name>.ts.ap): big-endian (byte offset, PTS) of every keyframe
+ACCESS_POINTS_SUFFIX = ".ap"
+ACCESS_POINT_DTYPE = np.dtype([('offset', '>u8'), ('pts', '>u8')])
+
+def find_sync_offset(data:np.ndarray, probe_packets:int=5) -> int:
+    """
+    Returns the offset of the first packet boundary, i.e. the first position
+    followed by sync bytes in probe_packets consecutive packets, or None.
+    """
+    for offset in range(min(TS_PACKET_SIZE, len(data))):
+        probe = data[offset:offset + probe_packets * TS_PACKET_SIZE:TS_PACKET_SIZE]
+        if len(probe) and np.all(probe == TS_SYNC_BYTE):
+            return offset
+    return None
+
+def view_packets(data:np.ndarray) -> np.ndarray:
+    """
+    Returns a (n,188) view on all complete packets in data, starting at the first sync byte.
+    """
+    offset = find_sync_offset(data)
+    if offset is None:
+        return np.empty((0, TS_PACKET_SIZE), dtype=np.uint8)
+    num_packets = (len(data) - offset) // TS_PACKET_SIZE
+    return data[offset:offset + num_packets * TS_PACKET_SIZE].reshape(num_packets, TS_PACKET_SIZE)
+
+def packet_pids(packets:np.ndarray) -> np.ndarray:
+    return ((packets[:, 1].astype(np.uint16) & 0x1F) << 8) | packets[:, 2]
+
+def iter_sections(packets:np.ndarray) -> Iterator[bytes]:
+    """
+    Reassembles the PSI/SI sections carried in the given packets of a single PID.
+    """
+    buffer = None
+    last_continuity_counter = None
+    for packet in packets:
+        packet = packet.tobytes()
+        payload_unit_start = packet[1] & 0x40
+        adaptation_field_control = (packet[3] >> 4) & 0x03
+        continuity_counter = packet[3] & 0x0F
+        if not adaptation_field_control & 0x01:
+            continue
+
+        # Drop a partially collected section if packets are missing
+        if last_continuity_counter is not None and continuity_counter != (last_continuity_counter + 1) & 0x0F:
+            buffer = None
+        last_continuity_counter = continuity_counter
+
+        pos = 4
+        if adaptation_field_control & 0x02:
+            pos += 1 + packet[4]
+        payload = packet[pos:]
+        if not payload:
+            continue
+
+        if payload_unit_start:
+            pointer = payload[0]
+            if buffer is not None:
+                buffer += payload[1:1 + pointer]
+                yield from _split_sections(buffer)
+            buffer = bytearray(payload[1 + pointer:])
+        elif buffer is not None:
+            buffer += payload
+        else:
+            continue
+
+        # Emit all sections completed by this packet and keep the unfinished rest
+        sections = list(_split_sections(buffer))
+        for section in sections:
+            yield section
+            del buffer[:len(section)]
+        if not buffer or buffer[0] == 0xFF:
+            buffer = None
+
+def _split_sections(buffer:bytearray) -> Iterator[bytes]:
+    pos = 0
+    while pos + 3 <= len(buffer) and buffer[pos] != 0xFF:
+        section_length = ((buffer[pos + 1] & 0x0F) << 8) | buffer[pos + 2]
+        end = pos + 3 + section_length
+        if end > len(buffer):
+            return
+        yield bytes(buffer[pos:end])
+        pos = end
+
+def read_program_map_pids(packets:np.ndarray) -> dict[int, int]:
+    """
+    Returns the PMT PIDs by program number (service id) as listed in the first PAT of the stream.
+    """
+    for section in iter_sections(packets[packet_pids(packets) == PAT_PID]):
+        if section[0] != PAT_TABLE_ID:
+            continue
+        program_map_pids = {}
+        # Program loop between the 8-byte section header and the CRC32
+        for pos in range(8, len(section) - 4, 4):
+            service_id = (section[pos] << 8) | section[pos + 1]
+            if service_id:
+                program_map_pids[service_id] = ((section[pos + 2] & 0x1F) << 8) | section[pos + 3]
+        return program_map_pids
+    return {}
+
+def read_service_ids(packets:np.ndarray) -> list[int]:
+    return list(read_program_map_pids(packets))
+
+def read_video_pid(packets:np.ndarray) -> int:
+    """
+    Returns the PID of the first video elementary stream announced in the PMT, or None.
+    """
+    pids = packet_pids(packets)
+    for program_map_pid in read_program_map_pids(packets).values():
+        for section in iter_sections(packets[pids == program_map_pid]):
+            if section[0] != PMT_TABLE_ID:
+                continue
+            program_info_length = ((section[10] & 0x0F) << 8) | section[11]
+            pos = 12 + program_info_length
+            while pos + 5 <= len(section) - 4:
+                stream_type = section[pos]
+                elementary_pid = ((section[pos + 1] & 0x1F) << 8) | section[pos + 2]
+                if stream_type in VIDEO_STREAM_TYPES:
+                    return elementary_pid
+                pos += 5 + (((section[pos + 3] & 0x0F) << 8) | section[pos + 4])
+            break
+    return None
+
+def iter_eit_events(section:bytes) -> Iterator[bytes]:
+    """
+    Yields the raw events of an EIT section, each one laid out like an Enigma2 .eit file:
+    the 12-byte event header followed by its descriptors.
+    """
+    pos = 14
+    end = len(section) - 4
+    while pos + 12 <= end:
+        descriptors_loop_length = ((section[pos + 10] & 0x0F) << 8) | section[pos + 11]
+        yield section[pos:pos + 12 + descriptors_loop_length]
+        pos += 12 + descriptors_loop_length
+
+def find_eit_event(data:np.ndarray) -> bytes:
+    """
+    Returns the raw EIT present event of the recorded service found in data, as stored
+    in an .eit file (12-byte event header followed by its descriptors), or None.
+    """
+    packets = view_packets(data)
+    pids = packet_pids(packets)
+    service_ids = read_service_ids(packets)
+
+    following_event = None
+    for section in iter_sections(packets[pids == EIT_PID]):
+        if section[0] != EIT_ACTUAL_PRESENT_FOLLOWING_TABLE_ID or len(section) < 18:
+            continue
+        service_id = (section[3] << 8) | section[4]
+        if service_ids and service_id not in service_ids:
+            continue
+        event = next(iter_eit_events(section), None)
+        if event is None:
+            continue
+        # Section 0 carries the present event, section 1 the following one
+        if section[6] == 0:
+            return event
+        if following_event is None:
+            following_event = event
+    return following_event
+
+def read_eit_event(path:str|Path, scan_size:int=EIT_SCAN_SIZE) -> bytes:
+    """
+    Searches the first scan_size bytes of a recording for the EIT present event of the recorded service.
+    """
+    with open(path, 'rb') as f:
+        if not f.seek(0, 2):
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            data = np.frombuffer(mm, dtype=np.uint8, count=min(scan_size, len(mm)))
+            event = find_eit_event(data)
+            # Release the view on the mapping before it is closed
+            del data
+            return event
+
+class PacketIndex():
+    """
+    Keyframe index of a recording (PTS and byte offset of every random access point
+    of the video stream) together with its continuity errors.
+    start_pts is the PTS at the start of the video stream, which precedes the first keyframe
+    if the recording starts within a group of pictures.
+    """
+    def __init__(self, video_pid:int, packet_count:int, keyframe_pts:np.ndarray, keyframe_offsets:np.ndarray, error_offsets:np.ndarray, error_pids:np.ndarray, start_pts:int=None) -> None:
+        self.video_pid = video_pid
+        self.packet_count = packet_count
+        self.keyframe_pts = keyframe_pts
+        self.keyframe_offsets = keyframe_offsets
+        self.error_offsets = error_offsets
+        self.error_pids = error_pids
+        self.start_pts = start_pts
+
+    @property
+    def keyframe_times(self) -> np.ndarray:
+        """Keyframe times in seconds from the start of the stream, as expected by ffmpeg -ss."""
+        if not len(self.keyframe_pts):
+            return np.empty(0)
+        start_pts = self.start_pts if self.start_pts is not None else self.keyframe_pts[0]
+        return (self.keyframe_pts - start_pts) / PTS_CLOCK
+
+    def keyframe_time_after(self, seconds:float) -> float:
+        """Returns the time of the first keyframe at or after seconds, or seconds if there is none."""
+        times = self.keyframe_times
+        pos = np.searchsorted(times, seconds)
+        return float(times[pos]) if pos < len(times) else seconds
+
+    def save(self, path:str|Path, stat=None) -> None:
+        np.savez(path,
+                 video_pid=self.video_pid if self.video_pid is not None else -1,
+                 packet_count=self.packet_count,
+                 keyframe_pts=self.keyframe_pts,
+                 keyframe_offsets=self.keyframe_offsets,
+                 error_offsets=self.error_offsets,
+                 error_pids=self.error_pids,
+                 start_pts=self.start_pts if self.start_pts is not None else -1,
+                 source=np.array([stat.st_size, stat.st_mtime_ns] if stat else [0, 0], dtype=np.int64))
+
+    @classmethod
+    def load(cls, path:str|Path, stat=None):
+        """Loads an index sidecar, returns None if it does not belong to a file with the given stat."""
+        with np.load(path) as data:
+            if stat and list(data['source']) != [stat.st_size, stat.st_mtime_ns]:
+                return None
+            video_pid = int(data['video_pid'])
+            start_pts = int(data['start_pts'])
+            return cls(video_pid=video_pid if video_pid >= 0 else None,
+                       packet_count=int(data['packet_count']),
+                       keyframe_pts=data['keyframe_pts'],
+                       keyframe_offsets=data['keyframe_offsets'],
+                       error_offsets=data['error_offsets'],
+                       error_pids=data['error_pids'],
+                       start_pts=start_pts if start_pts >= 0 else None)
+
+def _unwrap_pts(pts:np.ndarray) -> np.ndarray:
+    if len(pts) < 2:
+        return pts
+    wraps = np.cumsum(np.diff(pts) < -(PTS_WRAP // 2))
+    return np.concatenate([pts[:1], pts[1:] + wraps * PTS_WRAP])
+
+def _read_pts(packets:np.ndarray, payload_starts:np.ndarray) -> np.ndarray:
+    """
+    Extracts the PTS of PES headers starting at payload_starts, -1 where there is none.
+    """
+    pts = np.full(len(packets), -1, dtype=np.int64)
+    valid = payload_starts + 14 <= TS_PACKET_SIZE
+    rows = np.flatnonzero(valid)
+    header = packets[rows[:, None], payload_starts[rows, None] + np.arange(14)].astype(np.int64)
+    has_pts = (header[:, 0] == 0) & (header[:, 1] == 0) & (header[:, 2] == 1) & ((header[:, 7] & 0x80) != 0)
+    header = header[has_pts]
+    pts[rows[has_pts]] = (((header[:, 9] & 0x0E) << 29) | (header[:, 10] << 22) | ((header[:, 11] & 0xFE) << 14)
+                          | (header[:, 12] << 7) | (header[:, 13] >> 1))
+    return pts
+
+def _continuity_errors(pids:np.ndarray, continuity_counters:np.ndarray, last_counters:dict[int, int]) -> np.ndarray:
+    """
+    Returns the positions of packets whose continuity counter does not follow the previous
+    packet of the same PID, last_counters carries the counters across chunks.
+    """
+    if not len(pids):
+        return np.empty(0, dtype=np.int64)
+    order = np.argsort(pids, kind='stable')
+    sorted_pids = pids[order]
+    counters = continuity_counters[order].astype(np.int16)
+
+    group_start = np.empty(len(order), dtype=bool)
+    group_start[0] = True
+    group_start[1:] = sorted_pids[1:] != sorted_pids[:-1]
+
+    previous = np.empty_like(counters)
+    previous[1:] = counters[:-1]
+    for pos in np.flatnonzero(group_start):
+        previous[pos] = last_counters.get(int(sorted_pids[pos]), -1)
+
+    # A repeated counter marks a duplicate packet, which is allowed once
+    error = (previous >= 0) & (counters != (previous + 1) & 0x0F) & (counters != previous)
+
+    group_end = np.empty(len(order), dtype=bool)
+    group_end[-1] = True
+    group_end[:-1] = group_start[1:]
+    for pos in np.flatnonzero(group_end):
+        last_counters[int(sorted_pids[pos])] = int(counters[pos])
+
+    return np.sort(order[error])
+
+def index_packets(data:np.ndarray, chunk_packets:int=INDEX_CHUNK_PACKETS) -> PacketIndex:
+    """
+    Builds the keyframe index and continuity error report of the stream in data.
+    """
+    keyframe_pts, keyframe_offsets, pes_pts, pes_offsets = [], [], [], []
+    error_offsets, error_pids = [], []
+    last_counters:dict[int, int] = {}
+    video_pid = None
+    start_pts = None
+    packet_count = 0
+
+    start = find_sync_offset(data[:EIT_SCAN_SIZE])
+    if start is not None:
+        video_pid = read_video_pid(view_packets(data[start:start + EIT_SCAN_SIZE]))
+        packet_count = (len(data) - start) // TS_PACKET_SIZE
+        packets = data[start:start + packet_count * TS_PACKET_SIZE].reshape(packet_count, TS_PACKET_SIZE)
+
+        for first in range(0, packet_count, chunk_packets):
+            chunk = packets[first:first + chunk_packets]
+            offsets = start + (first + np.arange(len(chunk), dtype=np.int64)) * TS_PACKET_SIZE
+
+            sync = chunk[:, 0] == TS_SYNC_BYTE
+            pids = packet_pids(chunk)
+            payload_unit_start = (chunk[:, 1] & 0x40) != 0
+            adaptation_field_control = (chunk[:, 3] >> 4) & 0x03
+            continuity_counters = chunk[:, 3] & 0x0F
+            has_adaptation_field = (adaptation_field_control & 0x02) != 0
+            adaptation_field_length = np.where(has_adaptation_field, chunk[:, 4], 0)
+            adaptation_flags = np.where(has_adaptation_field & (adaptation_field_length > 0), chunk[:, 5], 0)
+            discontinuity = (adaptation_flags & 0x80) != 0
+            random_access = (adaptation_flags & 0x40) != 0
+
+            # Continuity errors, lost sync counts as error as well
+            counted = sync & ((adaptation_field_control & 0x01) != 0) & (pids != NULL_PID) & ~discontinuity
+            rows = np.flatnonzero(counted)
+            errors = rows[_continuity_errors(pids[rows], continuity_counters[rows], last_counters)]
+            errors = np.union1d(errors, np.flatnonzero(~sync))
+            error_offsets.append(offsets[errors])
+            error_pids.append(np.where(sync[errors], pids[errors], NULL_PID).astype(np.uint16))
+
+            if video_pid is None:
+                continue
+
+            # PTS of all PES starts of the video stream
+            rows = np.flatnonzero(sync & (pids == video_pid) & payload_unit_start & ((adaptation_field_control & 0x01) != 0))
+            payload_starts = 4 + np.where(has_adaptation_field[rows], 1 + adaptation_field_length[rows].astype(np.int64), 0)
+            pts = _read_pts(chunk[rows], payload_starts)
+            has_pts = pts >= 0
+            if start_pts is None and has_pts.any():
+                start_pts = int(pts[has_pts][:START_PTS_PES_COUNT].min())
+            pes_pts.append(pts[has_pts])
+            pes_offsets.append(offsets[rows][has_pts])
+            keyframe = has_pts & random_access[rows]
+            keyframe_pts.append(pts[keyframe])
+            keyframe_offsets.append(offsets[rows][keyframe])
+
+    def concatenate(arrays, dtype):
+        return np.concatenate(arrays).astype(dtype) if arrays else np.empty(0, dtype=dtype)
+
+    # Streams without random access indicators are indexed by all PES starts
+    if not sum(len(a) for a in keyframe_pts):
+        keyframe_pts, keyframe_offsets = pes_pts, pes_offsets
+
+    return PacketIndex(video_pid=video_pid,
+                       packet_count=packet_count,
+                       keyframe_pts=_unwrap_pts(concatenate(keyframe_pts, np.int64)),
+                       keyframe_offsets=concatenate(keyframe_offsets, np.int64),
+                       error_offsets=concatenate(error_offsets, np.int64),
+                       error_pids=concatenate(error_pids, np.uint16),
+                       start_pts=start_pts)
+
+def build_packet_index(path:str|Path, chunk_packets:int=INDEX_CHUNK_PACKETS) -> PacketIndex:
+    """
+    Scans a whole recording and builds its keyframe index and continuity error report.
+    """
+    with open(path, 'rb') as f:
+        if not f.seek(0, 2):
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            data = np.frombuffer(mm, dtype=np.uint8)
+            index = index_packets(data, chunk_packets)
+            # Release the view on the mapping before it is closed
+            del data
+            return index
+
+def packet_index_path(ts_path:str|Path) -> Path:
+    ts_path = Path(ts_path)
+    return ts_path.with_name(ts_path.name + TS_INDEX_SUFFIX)
+
+def access_points_path(ts_path:str|Path) -> Path:
+    ts_path = Path(ts_path)
+    return ts_path.with_name(ts_path.name + ACCESS_POINTS_SUFFIX)
+
+def load_packet_index(ts_path:str|Path, save:bool=False) -> PacketIndex:
+    """
+    Returns the packet index of a recording, read from its sidecar if it is up to date,
+    otherwise built from the stream and, with save, written to the sidecar.
+    """
+    ts_path = Path(ts_path)
+    stat = ts_path.stat()
+    index_path = packet_index_path(ts_path)
+    if index_path.is_file():
+        try:
+            index = PacketIndex.load(index_path, stat)
+            if index is not None:
+                return index
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Could not read packet index {index_path}: {e}")
+
+    print(f"Building packet index for {ts_path}")
+    index = build_packet_index(ts_path)
+    if index is not None and save:
+        try:
+            index.save(index_path, stat)
+        except OSError as e:
+            print(f"Could not write packet index {index_path}: {e}")
+    return index
+
+def read_access_points(ts_path:str|Path) -> PacketIndex:
+    """
+    Returns the keyframe index of a recording from its Enigma2 .ap file, or None if there is
+    none or it does not match the recording. Only the first few MB of the stream are read for
+    the start PTS, the index has no continuity error report.
+    """
+    ts_path = Path(ts_path)
+    ap_path = access_points_path(ts_path)
+    try:
+        size = ts_path.stat().st_size
+        access_points = np.fromfile(ap_path, dtype=ACCESS_POINT_DTYPE) if ap_path.is_file() and ap_path.stat().st_size % ACCESS_POINT_DTYPE.itemsize == 0 else None
+    except OSError as e:
+        print(f"Could not read access points {ap_path}: {e}")
+        return None
+    if access_points is None or not len(access_points):
+        return None
+    offsets = access_points['offset'].astype(np.int64)
+    # A stale or truncated .ap points beyond the recording or out of order
+    if offsets[-1] >= size or np.any(np.diff(offsets) <= 0):
+        return None
+
+    with open(ts_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        data = np.frombuffer(mm, dtype=np.uint8, count=min(EIT_SCAN_SIZE, len(mm)))
+        head = index_packets(data)
+        del data
+
+    pts = access_points['pts'].astype(np.int64)
+    return PacketIndex(video_pid=head.video_pid,
+                       packet_count=size // TS_PACKET_SIZE,
+                       keyframe_pts=_unwrap_pts(pts),
+                       keyframe_offsets=offsets,
+                       error_offsets=np.empty(0, dtype=np.int64),
+                       error_pids=np.empty(0, dtype=np.uint16),
+                       start_pts=head.start_pts)
+
+def load_keyframe_index(ts_path:str|Path) -> PacketIndex:
+    """
+    Returns the keyframe index of a recording from its .ap file if it is usable, otherwise from
+    its packet index sidecar or a scan of the stream. No sidecar is written next to the recording.
+    """
+    return read_access_points(ts_path) or load_packet_index(ts_path)
@@ -0,0 +1,137 @@
+"""
+Change notification for the recording directories below a root directory.
+
+InotifyWatcher uses the Linux inotify API through ctypes and only reports files that were
+created, written or moved in. PollingWatcher is the fallback for other systems and network
+file systems without inotify support, it lists the directories at every call.
+Both report all existing files at their first call.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from pathlib import Path
+
+# From sys/inotify.h
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct("iIII")
+EVENT_BUFFER_SIZE = 64 * 1024
+
+def list_recording_files(root:Path) -> set[Path]:
+    """Returns all files in the subdirectories of root."""
+    files = set()
+    for directory in root.iterdir():
+        if directory.is_dir():
+            files.update(f for f in directory.iterdir() if f.is_file())
+    return files
+
+class PollingWatcher():
+    def __init__(self, root:Path) -> None:
+        self.root = root
+        self._listed = False
+
+    def wait(self, timeout:float) -> set[Path]:
+        if self._listed:
+            time.sleep(timeout)
+        self._listed = True
+        return list_recording_files(self.root)
+
+    def close(self) -> None:
+        pass
+
+class InotifyWatcher():
+    def __init__(self, root:Path) -> None:
+        self.root = root
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._directories:dict[int, Path] = {}
+        self._initial:set[Path] = None
+
+        try:
+            self._add_watch(root)
+            for directory in root.iterdir():
+                if directory.is_dir():
+                    self._add_watch(directory)
+        except OSError:
+            self.close()
+            raise
+        # Files created before the watches were added are reported at the first call
+        self._initial = list_recording_files(root)
+
+    def _add_watch(self, directory:Path) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+        self._directories[wd] = directory
+
+    def wait(self, timeout:float) -> set[Path]:
+        if self._initial is not None:
+            changed, self._initial = self._initial, None
+            return changed
+
+        changed:set[Path] = set()
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return changed
+
+        while True:
+            try:
+                buffer = os.read(self._fd, EVENT_BUFFER_SIZE)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(buffer):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+                name = buffer[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0")
+                offset += EVENT_HEADER.size + length
+
+                if mask & IN_Q_OVERFLOW:
+                    # Events were lost, report everything once
+                    changed.update(list_recording_files(self.root))
+                    continue
+                directory = self._directories.get(wd)
+                if directory is None:
+                    continue
+                if mask & (IN_IGNORED | IN_DELETE_SELF):
+                    del self._directories[wd]
+                    continue
+
+                path = directory / os.fsdecode(name)
+                if directory == self.root:
+                    # A new recording directory, its files may have been created before its watch
+                    if mask & IN_ISDIR:
+                        try:
+                            self._add_watch(path)
+                            changed.update(f for f in path.iterdir() if f.is_file())
+                        except OSError as e:
+                            print(f"Could not watch {path}: {e}")
+                elif not mask & IN_ISDIR:
+                    changed.add(path)
+        return changed
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+def create_watcher(root:Path, poll_seconds:float) -> InotifyWatcher|PollingWatcher:
+    """
+    Returns an inotify watcher for root, or a polling watcher if inotify is not available.
+    """
+    try:
+        return InotifyWatcher(root)
+    except (OSError, AttributeError) as e:
+        print(f"inotify not available ({e}), polling {root} every {poll_seconds:.0f} s")
+        return PollingWatcher(root)
@@ -0,0 +1,154 @@
+"""
+Shared SQLite queue of recordings for pipeline-autocut workers on several machines.
+
+The queue file lives on the shared output directory. It uses the rollback journal instead of
+WAL, as WAL needs shared memory that network file systems do not provide, and every claim is
+a BEGIN IMMEDIATE transaction holding the database lock. A claimed recording is leased to its
+worker for a limited time, the worker renews the lease with heartbeats. Recordings whose lease
+expired (the worker crashed or lost the share) are claimed again by the next worker, until the
+item failed max_attempts times.
+
+Before a worker moves its results to the output directory, it marks the item as moving together
+with the path of its output. If the worker crashes during the move or before it completes the
+item, the next claim finds the expired item still moving: it is done if its output exists,
+otherwise it is claimed again. So a recording is never delivered twice.
+"""
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from nashome.utils.sqlite import ThreadConnections
+
+class QueueItem():
+    __slots__ = ("source", "series", "cost", "attempts", "previous_worker")
+
+    def __init__(self, source:str, series:str, cost:float, attempts:int, previous_worker:str) -> None:
+        self.source = Path(source)
+        self.series = series
+        self.cost = cost
+        self.attempts = attempts
+        self.previous_worker = previous_worker
+
+class WorkQueue():
+    def __init__(self, path:Path, max_attempts:int) -> None:
+        self.path = Path(path)
+        self.max_attempts = max_attempts
+        # Transactions are controlled explicitly
+        self._connections = ThreadConnections(self.path, ("PRAGMA journal_mode=DELETE",
+                                                          "CREATE TABLE IF NOT EXISTS queue (source TEXT PRIMARY KEY, series TEXT, cost REAL NOT NULL, state TEXT NOT NULL, "
+                                                          "worker TEXT, lease_until REAL, attempts INTEGER NOT NULL, updated REAL NOT NULL, output TEXT)"),
+                                              timeout=60, isolation_level=None)
+
+    def enqueue(self, items:list[tuple[Path, str, float]]) -> int:
+        """
+        Adds (source movie file, series, cost) items as pending, known sources keep their state. Returns the number of new items.
+        """
+        connection = self._connections.get()
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = connection.executemany("INSERT OR IGNORE INTO queue (source, series, cost, state, attempts, updated) VALUES (?, ?, ?, 'pending', 0, ?)",
+                                            [(str(source), series, cost, now) for source, series, cost in items])
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return cursor.rowcount
+
+    def claim(self, worker:str, lease_seconds:float) -> QueueItem:
+        """
+        Leases the cheapest pending (or expired) item to the worker, returns None if there is nothing to do.
+        """
+        connection = self._connections.get()
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            # The worker of an item still moving crashed, the item is done if its output was delivered
+            for source, output in connection.execute("SELECT source, output FROM queue WHERE state = 'moving' AND lease_until < ?", (now,)).fetchall():
+                if (self.path.parent/output).exists():
+                    connection.execute("UPDATE queue SET state = 'done', lease_until = NULL, updated = ? WHERE source = ?", (now, source))
+                else:
+                    connection.execute("UPDATE queue SET state = 'claimed', updated = ? WHERE source = ?", (now, source))
+            # An expired lease of the last attempt is not claimed again
+            connection.execute("UPDATE queue SET state = 'failed', lease_until = NULL, updated = ? WHERE state = 'claimed' AND lease_until < ? AND attempts >= ?",
+                               (now, now, self.max_attempts))
+            row = connection.execute("SELECT source, series, cost, attempts, worker FROM queue "
+                                     "WHERE (state = 'pending' OR (state = 'claimed' AND lease_until < ?)) AND attempts < ? "
+                                     "ORDER BY cost LIMIT 1", (now, self.max_attempts)).fetchone()
+            if row is not None:
+                connection.execute("UPDATE queue SET state = 'claimed', worker = ?, lease_until = ?, attempts = attempts + 1, updated = ? WHERE source = ?",
+                                   (worker, now + lease_seconds, now, row[0]))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        return QueueItem(row[0], row[1], row[2], row[3] + 1, row[4])
+
+    def heartbeat(self, source:Path, worker:str, lease_seconds:float) -> bool:
+        """
+        Renews the lease of the worker, returns False if the item is no longer leased to it.
+        """
+        now = time.time()
+        cursor = self._connections.get().execute("UPDATE queue SET lease_until = ?, updated = ? WHERE source = ? AND worker = ? AND state IN ('claimed', 'moving')",
+                                            (now + lease_seconds, now, str(source), worker))
+        return cursor.rowcount == 1
+
+    def start_moving(self, source:Path, worker:str, output:Path, lease_seconds:float) -> bool:
+        """
+        Marks the item of the worker as moving its results to output (relative to the directory of the queue) and
+        renews its lease, returns False if it lost the lease. Its results must only be moved if this succeeded.
+        """
+        now = time.time()
+        cursor = self._connections.get().execute("UPDATE queue SET state = 'moving', output = ?, lease_until = ?, updated = ? WHERE source = ? AND worker = ? AND state = 'claimed'",
+                                                 (str(output), now + lease_seconds, now, str(source), worker))
+        return cursor.rowcount == 1
+
+    def complete(self, source:Path, worker:str, success:bool) -> bool:
+        """
+        Marks the item of the worker as done or failed (failed items are retried until max_attempts), returns False if it lost the lease.
+        """
+        cursor = self._connections.get().execute("UPDATE queue SET state = CASE WHEN ? THEN 'done' WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                                            "lease_until = NULL, updated = ? WHERE source = ? AND worker = ? AND state IN ('claimed', 'moving')",
+                                            (success, self.max_attempts, time.time(), str(source), worker))
+        return cursor.rowcount == 1
+
+    def counts(self) -> dict[str, int]:
+        now = time.time()
+        rows = self._connections.get().execute("SELECT CASE WHEN state IN ('pending', 'claimed') AND attempts >= :max_attempts AND (state = 'pending' OR lease_until < :now) THEN 'failed' "
+                                          "WHEN state IN ('claimed', 'moving') AND lease_until < :now THEN 'expired' ELSE state END, COUNT(*) FROM queue GROUP BY 1",
+                                          {"max_attempts": self.max_attempts, "now": now}).fetchall()
+        return dict(rows)
+
+class LeaseKeeper():
+    """
+    Renews the lease of a claimed item in a background thread while the with block runs.
+    """
+    def __init__(self, queue:WorkQueue, source:Path, worker:str, lease_seconds:float) -> None:
+        self.queue = queue
+        self.source = source
+        self.worker = worker
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                if not self.queue.heartbeat(self.source, self.worker, self.lease_seconds):
+                    self.lost = True
+                    return
+            except sqlite3.OperationalError as e:
+                # The share may be busy, the lease is renewed at the next heartbeat
+                print(f"Warning: heartbeat for {self.source} failed: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
@@ -1,7 +1,17 @@
+"""
+Database of the YouTube videos already downloaded to an output directory.
+
+The video ids are kept in a SQLite file in the output directory, every id is committed as soon as
+its video is done, so an interrupted download loses nothing. A stored_videos.json of older versions
+is imported once and then renamed to stored_videos.json.migrated.
+"""
 from pathlib import Path
 import json
+import sqlite3
+import time
 
-from nashome.utils.constants import STORED_VIDEOS_FILENAME
+from nashome.utils.constants import STORED_VIDEOS_FILENAME, STORED_VIDEOS_DATABASE_FILENAME
+from nashome.utils.sqlite import ThreadConnections
 
 def read_stored_videos(outdir:Path|str) -> list[str]:
     stored_videos_path = Path(outdir) / STORED_VIDEOS_FILENAME
@@ -9,8 +19,32 @@ def read_stored_videos(outdir:Path|str) -> list[str]:
         return []
     return json.load(open(stored_videos_path, 'r'))
 
-def write_stored_videos(stored_videos:list[str], outpath:Path|str) -> None:
-    parent_dir = Path(outpath).parent
-    if not parent_dir.exists():
-        parent_dir.mkdir(parents=True, exist_ok=True)
-    json.dump(stored_videos, open(outpath, 'w'))
\ No newline at end of file
+class StoredVideos():
+    def __init__(self, outdir:Path|str) -> None:
+        self.outdir = Path(outdir)
+        self.path = self.outdir / STORED_VIDEOS_DATABASE_FILENAME
+        self._connections = ThreadConnections(self.path, ("PRAGMA journal_mode=WAL",
+                                                          "PRAGMA synchronous=FULL",
+                                                          "CREATE TABLE IF NOT EXISTS videos (video_id TEXT PRIMARY KEY, stored REAL NOT NULL)"),
+                                              on_connect=self._migrate)
+
+    def _migrate(self, connection:sqlite3.Connection) -> None:
+        json_path = self.outdir / STORED_VIDEOS_FILENAME
+        if not json_path.exists():
+            return
+        video_ids = read_stored_videos(self.outdir)
+        with connection:
+            connection.executemany("INSERT OR IGNORE INTO videos (video_id, stored) VALUES (?, ?)", [(video_id, time.time()) for video_id in video_ids])
+        json_path.rename(json_path.with_name(json_path.name + ".migrated"))
+        print(f"Imported {len(video_ids)} videos from {json_path} into {self.path}")
+
+    def __contains__(self, video_id:str) -> bool:
+        return self._connections.get().execute("SELECT 1 FROM videos WHERE video_id = ?", (video_id,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._connections.get().execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+
+    def add(self, video_id:str) -> None:
+        connection = self._connections.get()
+        with connection:
+            connection.execute("INSERT OR IGNORE INTO videos (video_id, stored) VALUES (?, ?)", (video_id, time.time()))
@@ -1,101 +1,160 @@
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from pydub import AudioSegment
-from pytubefix import YouTube, Playlist, Channel, Stream, StreamQuery
+from pytubefix import YouTube, Playlist, Channel, Stream, StreamQuery, extract
+import os
 import shutil
+import tempfile
+import threading
 
-from nashome.utils.constants import LANGUAGE_LIST, STORED_VIDEOS_FILENAME
-from nashome.youtube.database import read_stored_videos, write_stored_videos
+from nashome.utils.constants import LANGUAGE_LIST, YOUTUBE_AUDIO_FORMATS, YOUTUBE_DOWNLOAD_JOBS
+from nashome.youtube.database import StoredVideos
 from nashome.youtube.language import Language
-from nashome.utils.movie import merge_audio_and_video
+from nashome.youtube.metadata import VideoMetadata, fetch_metadata, get_extra_audio, prefetch_metadata
+from nashome.youtube.progress import DownloadProgress
+from nashome.utils.movie import convert_audio, merge_audio_and_video
+from nashome.utils.normalize import replace_forbidden_characters
 from nashome.utils.renamer import build_filename_from_title
 
-def download_youtube(urls:list[str], outdir:Path, audio_only:bool, language:str, try_all_seasons:bool, min_length:int, external_audio_dir:Path|None, audio_offset:float):
-    stored_videos = read_stored_videos(outdir)
+# Guards the output files being written by concurrent downloads
+_download_lock = threading.Lock()
+_reserved_outpaths:set[Path] = set()
+
+def download_youtube(urls:list[str], outdir:Path, audio_only:bool, language:str, try_all_seasons:bool, min_length:int, external_audio_dir:Path|None, audio_offset:float, jobs:int=YOUTUBE_DOWNLOAD_JOBS, audio_format:str=YOUTUBE_AUDIO_FORMATS[0]):
+    stored_videos = StoredVideos(outdir)
     for url in urls:
         if "@" in url:
-            download_channel(channel_url=url, outdir=outdir, language=language, try_all_seasons=try_all_seasons, audio_only=audio_only, stored_videos=stored_videos, min_length=min_length, external_audio_dir=external_audio_dir, audio_offset=audio_offset)
+            download_channel(channel_url=url, outdir=outdir, language=language, try_all_seasons=try_all_seasons, audio_only=audio_only, stored_videos=stored_videos, min_length=min_length, external_audio_dir=external_audio_dir, audio_offset=audio_offset, jobs=jobs, audio_format=audio_format)
         elif "playlist" in url:
-            download_playlist(playlist_url=url, outdir=outdir, language=language, try_all_seasons=try_all_seasons, audio_only=audio_only, stored_videos=stored_videos, min_length=min_length, external_audio_dir=external_audio_dir, audio_offset=audio_offset)
+            download_playlist(playlist_url=url, outdir=outdir, language=language, try_all_seasons=try_all_seasons, audio_only=audio_only, stored_videos=stored_videos, min_length=min_length, external_audio_dir=external_audio_dir, audio_offset=audio_offset, jobs=jobs, audio_format=audio_format)
         else:
-            download_stream(yt=url, outdir=outdir, language=language, try_all_seasons=try_all_seasons, audio_only=audio_only, min_length=min_length, external_audio_dir=external_audio_dir, audio_offset=audio_offset)
-
-    if stored_videos:
-        stored_videos_path = outdir / STORED_VIDEOS_FILENAME
-        old_videos = read_stored_videos(outdir)
-        if len(old_videos) == len(stored_videos):
-            return
-        
-        print(f"Writing {stored_videos_path}")
-        write_stored_videos(stored_videos=stored_videos, outpath=stored_videos_path)
-
-def download_channel(channel_url:str, outdir:str|Path, language:str, try_all_seasons:bool, audio_only:bool, stored_videos:list[str], min_length:int, external_audio_dir:Path|None, audio_offset:float):
+            download_stream(yt=url, outdir=outdir, language=language, try_all_seasons=try_all_seasons, audio_only=audio_only, min_length=min_length, external_audio_dir=external_audio_dir, audio_offset=audio_offset, audio_format=audio_format)
+
+def download_channel(channel_url:str, outdir:str|Path, language:str, try_all_seasons:bool, audio_only:bool, stored_videos:StoredVideos, min_length:int, external_audio_dir:Path|None, audio_offset:float, jobs:int=YOUTUBE_DOWNLOAD_JOBS, audio_format:str=YOUTUBE_AUDIO_FORMATS[0]):
     channel = Channel(channel_url, 'WEB', use_oauth=True, allow_oauth_cache=True)
     print(f"Downloading channel {channel.channel_name}")
     for playlist in channel.playlists:
-        download_playlist(playlist_url=playlist.playlist_url, outdir=outdir, language=language, try_all_seasons=try_all_seasons, audio_only=audio_only, stored_videos=stored_videos, min_length=min_length, external_audio_dir=external_audio_dir, audio_offset=audio_offset)
+        download_playlist(playlist_url=playlist.playlist_url, outdir=outdir, language=language, try_all_seasons=try_all_seasons, audio_only=audio_only, stored_videos=stored_videos, min_length=min_length, external_audio_dir=external_audio_dir, audio_offset=audio_offset, jobs=jobs, audio_format=audio_format)
     print("Channel done.")
 
-def download_playlist(playlist_url:str, outdir:str|Path, language:str, try_all_seasons:bool, audio_only:bool, stored_videos:list[str], min_length:int, external_audio_dir:Path|None, audio_offset:float):
+def download_playlist(playlist_url:str, outdir:str|Path, language:str, try_all_seasons:bool, audio_only:bool, stored_videos:StoredVideos, min_length:int, external_audio_dir:Path|None, audio_offset:float, jobs:int=YOUTUBE_DOWNLOAD_JOBS, audio_format:str=YOUTUBE_AUDIO_FORMATS[0]):
     playlist = Playlist(playlist_url, 'WEB', use_oauth=True, allow_oauth_cache=True)
     print(f"Downloading playlist {playlist.title}")
 
-    for video in playlist.videos:
-        if video.video_id in stored_videos:
-            continue
-        result = download_stream(yt=video, outdir=outdir, language=language, try_all_seasons=try_all_seasons, audio_only=audio_only, min_length=min_length, external_audio_dir=external_audio_dir, audio_offset=audio_offset)
+    # Known videos are skipped by the id in their url, before any request per video is made
+    video_urls = playlist.video_urls
+    new_video_urls = [url for url in video_urls if extract.video_id(url) not in stored_videos]
+    print(f"{len(video_urls) - len(new_video_urls)} of {len(video_urls)} videos already downloaded.")
+    existing_filenames = list_output_filenames(outdir)
+
+    # Skip and naming decisions are made from the metadata of all new videos, requested concurrently or taken from the cache
+    metadata = prefetch_metadata(new_video_urls)
+    progress = DownloadProgress(total_videos=len(metadata))
+
+    def download(item:tuple[str, VideoMetadata]) -> None:
+        url, video_metadata = item
+        video = YouTube(url, 'WEB', use_oauth=True, allow_oauth_cache=True)
+        video.register_on_progress_callback(progress.on_progress)
+        try:
+            result = download_stream(yt=video, outdir=outdir, language=language, try_all_seasons=try_all_seasons, audio_only=audio_only, min_length=min_length, external_audio_dir=external_audio_dir, audio_offset=audio_offset, existing_filenames=existing_filenames, metadata=video_metadata, audio_format=audio_format)
+        except Exception as e:
+            print(f"Error: Could not download {video.watch_url}: {e}")
+            result = False
+        # Every finished video is committed at once, an interrupted download resumes after it
         if result:
-            stored_videos.append(video.video_id)
-    print("Playlist done.")
+            stored_videos.add(video.video_id)
+        progress.finish_video()
 
+    # Up to jobs videos are downloaded at once, every download works in its own temporary directory
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        list(executor.map(download, metadata.items()))
+    print("Playlist done.")
 
-def download_stream(yt:str|YouTube, outdir:str|Path, language:str, try_all_seasons:bool, audio_only:bool, min_length:int, external_audio_dir:Path|None, audio_offset:float):
+def list_output_filenames(outdir:Path) -> set[str]:
+    """Returns the names of all files in the output directory, listed once instead of a stat per video."""
+    if not outdir.is_dir():
+        return set()
+    return {path.name for path in outdir.iterdir()}
+
+def get_output_filename(filename:str, audio_only:bool, audio_format:str) -> str:
+    """Returns the name of the file written for a download named filename, audio is converted to audio_format."""
+    return str(Path(filename).with_suffix(f'.{audio_format}')) if audio_only else filename
+
+def download_stream(yt:str|YouTube, outdir:str|Path, language:str, try_all_seasons:bool, audio_only:bool, min_length:int, external_audio_dir:Path|None, audio_offset:float, existing_filenames:set[str]|None=None, metadata:VideoMetadata|None=None, audio_format:str=YOUTUBE_AUDIO_FORMATS[0]):
+    """
+    Downloads a single video, returns True if it was downloaded or its file already exists.
+    existing_filenames is the listing of outdir shared by the videos of a playlist, it is listed here if not given.
+    metadata is the prefetched metadata of the video, it is requested here if not given.
+    """
     # differentiate between url and YouTube object
     if isinstance(yt, str):
         yt = YouTube(yt, 'WEB', use_oauth=True, allow_oauth_cache=True)
+    if existing_filenames is None:
+        existing_filenames = list_output_filenames(outdir)
+    if metadata is None:
+        metadata = fetch_metadata(yt)
+
+    # a video named after its plain title is found before TMDB is requested
+    plain_filename = get_output_filename(f"{replace_forbidden_characters(metadata.title)}.{'m4a' if audio_only else 'mp4'}", audio_only, audio_format)
+    if plain_filename in existing_filenames:
+        print(f"File {plain_filename} already exists.")
+        return True
 
     # check length of video
-    if yt.length < min_length * 60:
-        print(f"Video {yt.title} is shorter than {min_length} minutes. Skipping.")
+    if metadata.length < min_length * 60:
+        print(f"Video {metadata.title} is shorter than {min_length} minutes. Skipping.")
         return False
 
-    # check if extra audio tracks are available
-    audio_tracks = yt.streams.get_extra_audio_track()
-    language_code = "en-US" if audio_tracks else "de-DE"
+    # videos with extra audio tracks are named in English, this needs the stream manifest
+    language_code = "en-US" if get_extra_audio(yt, metadata) else "de-DE"
 
     # define output file name
-    output_filename, episode_name = build_filename_from_title(title=yt.title, suffix='m4a' if audio_only else 'mp4', language_code=language_code, try_all_seasons=try_all_seasons)
+    output_filename, episode_name = build_filename_from_title(title=metadata.title, suffix='m4a' if audio_only else 'mp4', language_code=language_code, try_all_seasons=try_all_seasons)
+
+    # check if file already exists or is being downloaded by a concurrent job
+    outpath = outdir/get_output_filename(output_filename, audio_only, audio_format)
+    with _download_lock:
+        if outpath.name in existing_filenames:
+            print(f"File {outpath.name} already exists.")
+            return True
+        if outpath in _reserved_outpaths:
+            print(f"File {outpath.name} is already being downloaded.")
+            return False
+        _reserved_outpaths.add(outpath)
 
-    # check if file already exists
-    if (outdir/output_filename).is_file():
-        print(f"File {output_filename} already exists.")
-        return False
-    
-    # create output directory
-    outdir.mkdir(parents=True, exist_ok=True)
-    
-    # progress output
-    print(f"Downloading {"audio" if audio_only else "video"} {yt.title}")
-    
-    if audio_only:
-        download_audio(yt=yt, outdir=outdir, outfilename=output_filename)
-        return True
+    try:
+        # create output directory and a temporary directory of this download
+        outdir.mkdir(parents=True, exist_ok=True)
+        temporary_directory = Path(tempfile.mkdtemp(prefix=".tmp_", dir=outdir))
 
-    result = download_audio_and_video(yt=yt, outdir=outdir, outfilename=output_filename, audio_tracks=audio_tracks, episode_name=episode_name, language=language, external_audio_dir=external_audio_dir, audio_offset=audio_offset)
+        # progress output
+        print(f"Downloading {"audio" if audio_only else "video"} {metadata.title}")
+
+        try:
+            if audio_only:
+                download_audio(yt=yt, outdir=outdir, outfilename=output_filename, temporary_directory=temporary_directory, audio_format=audio_format)
+                result = True
+            else:
+                audio_tracks = yt.streams.get_extra_audio_track()
+                result = download_audio_and_video(yt=yt, outdir=outdir, outfilename=output_filename, audio_tracks=audio_tracks, episode_name=episode_name, language=language, external_audio_dir=external_audio_dir, audio_offset=audio_offset, temporary_directory=temporary_directory)
+        finally:
+            shutil.rmtree(temporary_directory, ignore_errors=True)
+    finally:
+        with _download_lock:
+            _reserved_outpaths.discard(outpath)
+            if outpath.is_file():
+                existing_filenames.add(outpath.name)
 
     print(f"Stream done.")
     return result
 
-def download_audio(yt:str|YouTube, outdir:str|Path, outfilename:str):
-    # define output directory
-    temporary_directory = Path(outdir) / 'tmp' 
-
-    # Download audio and convert to mp3
+def download_audio(yt:str|YouTube, outdir:str|Path, outfilename:str, temporary_directory:Path, audio_format:str=YOUTUBE_AUDIO_FORMATS[0]):
+    # Download audio and convert it in the temporary directory, which is removed by the caller
     yt.streams.get_audio_only().download(output_path=str(temporary_directory), filename=outfilename)
-    audio = AudioSegment.from_file(str(temporary_directory/outfilename), format="m4a")
-    audio.export((outdir/outfilename).with_suffix('.mp3'), format="mp3")
-
-    # Clean up
-    shutil.rmtree(temporary_directory)
+    outpath = outdir/get_output_filename(outfilename, audio_only=True, audio_format=audio_format)
+    # The converted file is moved into outdir when complete, so a partial file never counts as downloaded
+    converted_path = temporary_directory/f"converted{outpath.suffix}"
+    convert_audio(temporary_directory/outfilename, converted_path)
+    os.replace(converted_path, outpath)
 
 def _find_external_audio(episode_key:str, external_audio_dir:Path) -> Path|None:
     """Search recursively for an external audio file whose name contains the episode_key.
@@ -131,10 +190,7 @@ def _extract_or_convert_audio(source:Path, target_dir:Path, target_stem:str) ->
         return None
     return out_audio
 
-def download_audio_and_video(yt:YouTube, outdir:str|Path, outfilename:str, audio_tracks:StreamQuery, episode_name:str, language:str, external_audio_dir:Path|None, audio_offset:float):
-    # define temporary directory
-    temporary_directory = Path(outdir) / 'tmp' 
-
+def download_audio_and_video(yt:YouTube, outdir:str|Path, outfilename:str, audio_tracks:StreamQuery, episode_name:str, language:str, external_audio_dir:Path|None, audio_offset:float, temporary_directory:Path):
     # define language name if not specified
     if language:
         if language in LANGUAGE_LIST:
@@ -0,0 +1,73 @@
+"""
+Metadata of YouTube videos needed for the download decisions (title, length, extra audio tracks).
+
+The title and length of all pending videos of a playlist are fetched concurrently and kept in a
+SQLite cache (see nashome.utils.cache), so rescanning a playlist only requests videos that are new or
+whose cached metadata expired. Whether a video has extra audio tracks needs its stream manifest,
+it is only requested for videos that pass the title and length checks (see get_extra_audio).
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pytubefix import YouTube, extract
+
+from nashome.utils.cache import ResponseCache, get_cache_dir
+from nashome.utils.constants import YOUTUBE_METADATA_CACHE_FILENAME, YOUTUBE_METADATA_JOBS, YOUTUBE_METADATA_TTL
+
+_metadata_cache:ResponseCache = None
+_metadata_cache_lock = threading.Lock()
+
+class VideoMetadata():
+    __slots__ = ("video_id", "title", "length", "extra_audio")
+
+    def __init__(self, video_id:str, title:str, length:int, extra_audio:bool=None) -> None:
+        self.video_id = video_id
+        self.title = title
+        self.length = length
+        self.extra_audio = extra_audio
+
+    def to_document(self) -> dict:
+        return {"title": self.title, "length": self.length, "extra_audio": self.extra_audio}
+
+def get_metadata_cache() -> ResponseCache:
+    global _metadata_cache
+    path = get_cache_dir() / YOUTUBE_METADATA_CACHE_FILENAME
+    with _metadata_cache_lock:
+        if _metadata_cache is None or _metadata_cache.path != path:
+            _metadata_cache = ResponseCache(path)
+        return _metadata_cache
+
+def fetch_metadata(yt:YouTube) -> VideoMetadata:
+    """Requests the title and length of the video and caches them."""
+    metadata = VideoMetadata(yt.video_id, yt.title, yt.length)
+    get_metadata_cache().put(metadata.video_id, metadata.to_document())
+    return metadata
+
+def get_extra_audio(yt:YouTube, metadata:VideoMetadata) -> bool:
+    """Returns whether the video has extra audio tracks, its stream manifest is only requested if that is not cached yet."""
+    if metadata.extra_audio is None:
+        metadata.extra_audio = bool(yt.streams.get_extra_audio_track())
+        get_metadata_cache().put(metadata.video_id, metadata.to_document())
+    return metadata.extra_audio
+
+def get_metadata(url:str, ttl:float=YOUTUBE_METADATA_TTL) -> VideoMetadata:
+    """Returns the cached metadata of the video, or requests it if it is unknown or older than ttl seconds."""
+    video_id = extract.video_id(url)
+    document = get_metadata_cache().get(video_id, ttl)
+    if document is not None:
+        return VideoMetadata(video_id, document["title"], document["length"], document.get("extra_audio"))
+    return fetch_metadata(YouTube(url, 'WEB', use_oauth=True, allow_oauth_cache=True))
+
+def prefetch_metadata(urls:list[str], jobs:int=YOUTUBE_METADATA_JOBS, ttl:float=YOUTUBE_METADATA_TTL) -> dict[str, VideoMetadata]:
+    """
+    Returns the metadata of the videos by url, up to jobs videos are requested at once.
+    Videos whose metadata could not be requested are missing from the result.
+    """
+    def get(url:str) -> VideoMetadata:
+        try:
+            return get_metadata(url, ttl)
+        except Exception as e:
+            print(f"Error: Could not get metadata of {url}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        return {url: metadata for url, metadata in zip(urls, executor.map(get, urls)) if metadata is not None}
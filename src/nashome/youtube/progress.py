@@ -0,0 +1,38 @@
+"""
+Aggregated progress of concurrent YouTube downloads, printed as one line at most once per interval.
+"""
+import threading
+import time
+
+from pytubefix import Stream
+
+class DownloadProgress():
+    def __init__(self, total_videos:int, interval:float=2.0) -> None:
+        self.total_videos = total_videos
+        self.interval = interval
+        self.finished_videos = 0
+        self._streams:dict[int, tuple[int, int]] = {}
+        self._lock = threading.Lock()
+        self._last_print = 0.0
+
+    def on_progress(self, stream:Stream, chunk:bytes, bytes_remaining:int) -> None:
+        """Progress callback for pytubefix, see YouTube.register_on_progress_callback."""
+        with self._lock:
+            self._streams[id(stream)] = (stream.filesize, stream.filesize - bytes_remaining)
+            now = time.monotonic()
+            if now - self._last_print < self.interval:
+                return
+            self._last_print = now
+            line = self._format()
+        print(line)
+
+    def finish_video(self) -> None:
+        with self._lock:
+            self.finished_videos += 1
+            line = self._format()
+        print(line)
+
+    def _format(self) -> str:
+        total = sum(size for size, _ in self._streams.values())
+        done = sum(downloaded for _, downloaded in self._streams.values())
+        return f"[{self.finished_videos}/{self.total_videos} videos] {done / 2**20:.1f}/{total / 2**20:.1f} MB downloaded"
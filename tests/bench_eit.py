@@ -0,0 +1,72 @@
+"""
+Benchmark of the EIT parser: full EitContent construction and field access per file.
+
+    python tests/bench_eit.py [--files N] [--baseline REV]
+
+With --baseline, the eit.py of the given git revision (e.g. the commit before a change) is
+measured on the same files as well. Revisions that support it read each file once (texts=True),
+as the batch API does.
+
+The goal of the parser rewrite was an order of magnitude against the original parser (f071aa3).
+It is not reached: on synthetic German recordings the parse drops from 280-360 us to 60-70 us
+per file, 4.5-6x depending on the machine load. Most of the remaining time is the Python
+descriptor loop, the open and stat calls and the cache bookkeeping.
+"""
+import inspect
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from pathlib import Path
+
+from eit_data import german_episode
+from nashome.utils import eit
+
+def load_revision(revision:str) -> types.ModuleType:
+    source = subprocess.run(["git", "show", f"{revision}:src/nashome/utils/eit.py"], cwd=Path(__file__).parents[1],
+                            capture_output=True, text=True, check=True).stdout
+    module = types.ModuleType(f"eit_{revision}")
+    exec(compile(source, module.__name__, "exec"), module.__dict__)
+    return module
+
+def measure(module:types.ModuleType, paths:list[Path], repeat:int) -> float:
+    """Returns the best time per file in microseconds, the process-wide cache is cleared before every run."""
+    options = {"texts": True} if "texts" in inspect.signature(module.EitContent).parameters else {}
+    best = float("inf")
+    for _ in range(repeat):
+        if hasattr(module, "clear_eit_cache"):
+            module.clear_eit_cache()
+        start = time.perf_counter()
+        for path in paths:
+            content = module.EitContent(path, **options)
+            content.getEitName()
+            content.getEitShortDescription()
+            content.getEitDescription()
+            content.getEitDuration()
+        best = min(best, time.perf_counter() - start)
+    return best / len(paths) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the EIT parser on synthetic German recordings.")
+    parser.add_argument("--files", type=int, default=2000, help="Number of .eit files (default: 2000).")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of runs, the best one is reported (default: 5).")
+    parser.add_argument("--baseline", type=str, help="Git revision whose eit.py is measured for comparison.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for i in range(args.files):
+            path = Path(directory) / f"recording{i}.eit"
+            path.write_bytes(german_episode())
+            paths.append(path)
+
+        modules = [("current", eit)]
+        if args.baseline:
+            modules.insert(0, (args.baseline, load_revision(args.baseline)))
+        for name, module in modules:
+            print(f"{name:>12}: {measure(module, paths, args.repeat):8.1f} us per file")
+
+if __name__ == "__main__":
+    sys.exit(main())
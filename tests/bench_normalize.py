@@ -0,0 +1,39 @@
+"""
+Benchmark of the title normalization against the sequential reference implementation.
+
+    python tests/bench_normalize.py [--calls N]
+
+filter_string is measured cold (without its memo) and memoized, on random titles of the
+corpus of test_normalize.
+"""
+import argparse
+import random
+import time
+
+from nashome.utils import normalize
+from test_normalize import TITLES, reference_filter_string, reference_replace_forbidden_characters
+
+def measure(function, work:list[str]) -> float:
+    start = time.perf_counter()
+    for title in work:
+        function(title)
+    return (time.perf_counter() - start) / len(work) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark filter_string and replace_forbidden_characters.")
+    parser.add_argument("--calls", type=int, default=20000, help="Number of calls per function (default: 20000).")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the title selection (default: 0).")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    work = [random.choice(TITLES) for _ in range(args.calls)]
+    print(f"{len(TITLES)} titles, {args.calls} calls")
+    for name, function in (("reference filter_string", reference_filter_string),
+                           ("filter_string (cold)", normalize._filter_string.__wrapped__),
+                           ("filter_string (memoized)", normalize.filter_string),
+                           ("reference replace_forbidden_characters", reference_replace_forbidden_characters),
+                           ("replace_forbidden_characters", normalize.replace_forbidden_characters)):
+        print(f"{name:>40}: {measure(function, work):6.2f} us per call")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+Builders for synthetic Enigma2 .eit files (12-byte event header followed by its descriptors).
+"""
+import struct
+
+UTF8 = b"\x15"
+LATIN9 = b"\x0b"
+
+def _bcd(value:int) -> int:
+    return ((value // 10) << 4) | (value % 10)
+
+def short_event(language:bytes, name:bytes, text:bytes) -> bytes:
+    body = language + bytes([len(name)]) + name + bytes([len(text)]) + text
+    return bytes([0x4d, len(body)]) + body
+
+def extended_event(language:bytes, text:bytes, number:int=0) -> bytes:
+    body = bytes([number]) + language + b"\x00" + bytes([len(text)]) + text
+    return bytes([0x4e, len(body)]) + body
+
+def event(descriptors:list[bytes], duration:tuple[int, int, int]=(0, 25, 30)) -> bytes:
+    data = b"".join(descriptors)
+    header = struct.pack(">HHBBBBBBH", 1, 60000, _bcd(20), _bcd(15), 0, _bcd(duration[0]), _bcd(duration[1]), _bcd(duration[2]), (4 << 13) | len(data))
+    return header + data
+
+def german_episode() -> bytes:
+    """A typical German recording: name, short text and two extended descriptors in UTF-8."""
+    description = "Ash und Pikachu reisen weiter.\nGäste: Rocko. " * 5
+    encoded = description.encode()
+    return event([short_event(b"deu", UTF8 + "Pokémon".encode(), UTF8 + "Die Rückkehr des Meisters".encode()),
+                  extended_event(b"deu", UTF8 + encoded[:240], 0),
+                  extended_event(b"deu", UTF8 + encoded[240:], 1),
+                  b"\x54\x02\x10\x00"])
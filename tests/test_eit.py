@@ -0,0 +1,66 @@
+from nashome.utils.eit import EitContent, clear_eit_cache, read_eit_records
+from eit_data import LATIN9, UTF8, event, extended_event, german_episode, short_event
+
+def write_eit(tmp_path, data:bytes, name:str="recording"):
+    path = tmp_path / f"{name}.eit"
+    path.write_bytes(data)
+    clear_eit_cache()
+    return path
+
+def test_utf8_fields(tmp_path):
+    eit = EitContent(write_eit(tmp_path, german_episode()))
+    assert eit.getEitName() == "Pokémon"
+    assert eit.getEitShortDescription() == "Die Rückkehr des Meisters"
+    assert eit.getEitDescription() == ("Ash und Pikachu reisen weiter.\nGäste: Rocko. " * 5).strip()
+    assert eit.getEitDuration() == (0, 25, 30)
+
+def test_latin9_codepage(tmp_path):
+    data = event([short_event(b"deu", LATIN9 + "Rückkehr für 5 €".encode("iso-8859-15"), LATIN9 + "Größe".encode("iso-8859-15"))])
+    eit = EitContent(write_eit(tmp_path, data))
+    assert eit.getEitName() == "Rückkehr für 5 €"
+    assert eit.getEitShortDescription() == "Größe"
+
+def test_missing_codepage(tmp_path):
+    # Without a selector byte the encoding is guessed, this raised a TypeError before
+    text = "Die Rückkehr des Meisters über die Brücke"
+    data = event([short_event(b"deu", text.encode(), text.encode())])
+    eit = EitContent(write_eit(tmp_path, data))
+    assert eit.getEitName() == text
+    assert eit.getEitDescription() == text
+
+def test_german_descriptors_preferred(tmp_path):
+    data = event([short_event(b"eng", UTF8 + b"Return", UTF8 + b"English"),
+                  short_event(b"deu", UTF8 + "Rückkehr".encode(), UTF8 + b"Deutsch")])
+    eit = EitContent(write_eit(tmp_path, data))
+    assert eit.getEitName() == "Rückkehr"
+    assert eit.getEitShortDescription() == "Deutsch"
+
+def test_other_languages_joined(tmp_path):
+    data = event([short_event(b"eng", UTF8 + b"Return", UTF8 + b"English"),
+                  short_event(b"fra", UTF8 + b"Retour", UTF8 + b"French")])
+    eit = EitContent(write_eit(tmp_path, data))
+    assert eit.getEitName() == "Return Retour"
+    assert eit.getEitShortDescription() == "English\n\nFrench"
+
+def test_missing_file(tmp_path):
+    eit = EitContent(tmp_path / "missing.eit")
+    assert eit.getEitName() == ""
+    assert eit.getEitDuration() == ""
+
+def test_read_eit_records(tmp_path):
+    paths = [write_eit(tmp_path, german_episode(), f"recording{i}") for i in range(3)]
+    records = read_eit_records(paths)
+    assert [record.path for record in records] == paths
+    assert all(record.name == "Pokémon" and record.duration == (0, 25, 30) for record in records)
+
+def test_read_eit_records_opens_once(tmp_path, monkeypatch):
+    paths = [write_eit(tmp_path, german_episode(), f"recording{i}") for i in range(3)]
+    opened = []
+    open_file = open
+    monkeypatch.setattr("builtins.open", lambda file, *args, **kwargs: opened.append(file) or open_file(file, *args, **kwargs))
+    records = read_eit_records(paths)
+    assert sorted(opened) == sorted(str(path) for path in paths)
+
+    # The cache serves the texts afterwards
+    assert [record.description for record in records] == [EitContent(path).getEitDescription() for path in paths]
+    assert len(opened) == len(paths)
@@ -0,0 +1,64 @@
+import json
+import re
+from pathlib import Path
+
+import pytest
+from unidecode import unidecode
+
+from nashome.utils.constants import SERIES_LIST
+from nashome.utils.normalize import filter_string, replace_forbidden_characters
+
+EPISODES_DIRECTORY = Path(__file__).parents[1] / "data" / "episodes"
+
+EDGE_CASES = ["Ash versus Gary", "ver-sus", "ver sus", "ver.sus", "versusversus", "A & B", "x y z", "Tab\tNew\nline\x1c",
+              "Pokémon: Wer ist das?!", "a/b\\c|d<e>f*g\"h'i", "Pokémon Horizonte Folge 3 | Ein neuer Tag | Ganze Folge",
+              "Ça va, l'été à Zürich", "Ωmega – Ende…", "", "   "]
+
+def reference_replace_forbidden_characters(string:str) -> str:
+    """The sequential replacements normalize.replace_forbidden_characters must be equivalent to."""
+    for key, value in {"/": "-", ":": "", "?": "", "*": "", '"': "", "'": "", "<": "-", ">": "-", "|": "-", "\\": "-"}.items():
+        string = string.replace(key, value)
+    return string
+
+def reference_filter_string(string:str|bytes) -> str:
+    """The sequential regex substitutions normalize.filter_string must be equivalent to."""
+    if isinstance(string, bytes):
+        string = string.decode('utf-8', 'ignore')
+    keyword_replace = {r"_": "", r"\'": "", r"\.": "", r"\!": "", r"\?": "", r"\-": " ", r"\,": " ", r"\:": "", r'"': "", r"'": "",
+                       r"versus": "vs", r"\&": "and", r"\s+": ""}
+    filtered_string = unidecode(string.lower())
+    for key, value in keyword_replace.items():
+        filtered_string = re.sub(key, value, filtered_string)
+    return filtered_string.strip()
+
+def load_titles() -> list[str]:
+    """Series names, the film and episode titles of data/episodes and the edge cases."""
+    titles = [series.name for series in SERIES_LIST]
+    movie_titles = EPISODES_DIRECTORY / "movie_titles.json"
+    if movie_titles.is_file():
+        titles += list(json.loads(movie_titles.read_text(encoding="utf-8")).values())
+    episodes_events = EPISODES_DIRECTORY / "episodes_events.json"
+    if episodes_events.is_file():
+        for event in json.loads(episodes_events.read_text(encoding="utf-8")).values():
+            titles += [text for text in event if isinstance(text, str)]
+    return titles + EDGE_CASES
+
+TITLES = load_titles()
+
+def test_titles_loaded():
+    assert len(TITLES) > len(SERIES_LIST) + len(EDGE_CASES)
+
+@pytest.mark.parametrize("title", EDGE_CASES)
+def test_filter_string_edge_cases(title):
+    assert filter_string(title) == reference_filter_string(title)
+
+def test_filter_string_equivalent():
+    mismatches = [title for title in TITLES if filter_string(title) != reference_filter_string(title)]
+    assert not mismatches
+
+def test_filter_string_bytes():
+    assert filter_string("Pokémon & versus".encode()) == reference_filter_string("Pokémon & versus".encode()) == "pokemonandvs"
+
+def test_replace_forbidden_characters_equivalent():
+    mismatches = [title for title in TITLES if replace_forbidden_characters(title) != reference_replace_forbidden_characters(title)]
+    assert not mismatches
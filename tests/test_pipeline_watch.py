@@ -0,0 +1,49 @@
+from nashome.utils import pipeline_watch
+from nashome.utils.constants import PIPELINE_JOURNAL_FILENAME, PIPELINE_MAX_ATTEMPTS
+from nashome.utils.journal import JobJournal
+from nashome.utils.pipeline_watch import watch_and_autocut
+
+class FakeWatcher():
+    """Reports all recordings on every wait like the polling watcher, and stops watching after polls waits."""
+    def __init__(self, recordings:list, polls:int) -> None:
+        self.recordings = recordings
+        self.polls = polls
+
+    def wait(self, timeout:float) -> set:
+        self.polls -= 1
+        if self.polls < 0:
+            raise KeyboardInterrupt
+        return set(self.recordings)
+
+    def close(self) -> None:
+        pass
+
+def test_watch_retries_failed_recordings(tmp_path, monkeypatch):
+    recordings = tmp_path / "recordings" / "Tagesschau"
+    recordings.mkdir(parents=True)
+    good, bad = recordings / "good.ts", recordings / "bad.ts"
+    for path in [good, bad]:
+        path.write_bytes(b"\x00" * 188)
+        path.with_suffix(".eit").write_bytes(b"")
+    journal = JobJournal(tmp_path / "output" / PIPELINE_JOURNAL_FILENAME)
+
+    # The good recording fails once, the bad one always
+    handed_over = []
+    def cleanup_and_autocut(recording_movie_files, **options):
+        handed_over.extend(sorted(path.name for path in recording_movie_files))
+        if handed_over.count("good.ts") > 1:
+            journal.record(good, "moved")
+
+    monkeypatch.setattr(pipeline_watch, "create_watcher", lambda root, poll_seconds: FakeWatcher([good, bad], 10))
+    monkeypatch.setattr(pipeline_watch, "cleanup_and_autocut", cleanup_and_autocut)
+    watch_and_autocut(tmp_path / "recordings", tmp_path / "output", settle_seconds=0)
+    assert handed_over.count("good.ts") == 2
+    assert handed_over.count("bad.ts") == PIPELINE_MAX_ATTEMPTS
+
+    # A changed recording is taken again
+    handed_over.clear()
+    bad.write_bytes(b"\x00" * 376)
+    good.write_bytes(b"\x00" * 376)
+    monkeypatch.setattr(pipeline_watch, "create_watcher", lambda root, poll_seconds: FakeWatcher([good, bad], 2))
+    watch_and_autocut(tmp_path / "recordings", tmp_path / "output", settle_seconds=0)
+    assert handed_over == ["bad.ts", "good.ts"]
@@ -0,0 +1,83 @@
+import multiprocessing
+import os
+import time
+
+from nashome.utils import pipeline, pipeline_worker
+from nashome.utils.constants import PIPELINE_WORK_QUEUE_FILENAME
+from nashome.utils.pipeline_worker import enqueue_recordings, remove_stale_directory, run_autocut_worker
+from nashome.utils.work_queue import WorkQueue
+from eit_data import UTF8, event, short_event
+
+RECORDINGS = 8
+
+def test_remove_stale_directory(tmp_path):
+    directory = tmp_path / "recording.worker"
+    (directory / "trimmed").mkdir(parents=True)
+    (directory / "trimmed" / "recording.ts").write_bytes(b"")
+    assert not remove_stale_directory(directory, 60)
+    assert directory.is_dir()
+
+    # Nothing changed for longer than max_age
+    old = time.time() - 120
+    for path in [directory, directory / "trimmed", directory / "trimmed" / "recording.ts"]:
+        os.utime(path, (old, old))
+    assert remove_stale_directory(directory, 60)
+    assert not directory.exists()
+    assert not remove_stale_directory(directory, 60)
+
+def write_share(tmp_path) -> None:
+    recordings = tmp_path / "recordings" / "Tagesschau"
+    recordings.mkdir(parents=True)
+    for number in range(RECORDINGS):
+        stem = f"202401{number + 1:02d} 2000 - Das Erste HD - Tagesschau"
+        (recordings / f"{stem}.ts").write_bytes(b"\x00" * 188 * 10)
+        (recordings / f"{stem}.eit").write_bytes(event([short_event(b"deu", UTF8 + f"Tagesschau {number}".encode(), UTF8 + b"Nachrichten")]))
+    for position in ["start", "end"]:
+        (tmp_path / "templates" / "tagesschau" / position).mkdir(parents=True)
+        (tmp_path / "templates" / "tagesschau" / position / "logo.png").write_bytes(b"")
+
+def run_worker(tmp_path, worker_id:str, crash:str) -> None:
+    """Runs a worker process with stubbed detection and cutting, it exits without cleanup at the stage given by crash."""
+    def detect_cut_times(video_path, **options):
+        if crash == "detect":
+            os._exit(3)
+        time.sleep(0.2)
+        return 1.0, 2.0
+
+    def trim_video(video_path, outdir, start_time, end_time):
+        outdir.mkdir(parents=True, exist_ok=True)
+        (outdir / video_path.name).write_text(worker_id)
+        return outdir / video_path.name
+
+    def move_recording(job):
+        moved = pipeline.move_recording(job)
+        with open(tmp_path / "deliveries.log", 'a') as f:
+            f.write(f"{job.trimmed_file.name}\n")
+        if crash == "move":
+            os._exit(3)
+        return moved
+
+    pipeline.detect_cut_times, pipeline.trim_video, pipeline_worker.move_recording = detect_cut_times, trim_video, move_recording
+    run_autocut_worker(tmp_path / "recordings", tmp_path / "templates", tmp_path / "output", worker_id=worker_id, lease_seconds=1)
+
+def test_worker_processes(tmp_path, monkeypatch):
+    monkeypatch.setenv("NASHOME_CACHE_DIR", str(tmp_path / "cache"))
+    write_share(tmp_path)
+    assert enqueue_recordings(tmp_path / "recordings", tmp_path / "templates", tmp_path / "output")
+
+    # Two of the workers crash, one during the detection and one after delivering a recording
+    context = multiprocessing.get_context("spawn")
+    workers = {worker_id: context.Process(target=run_worker, args=(tmp_path, worker_id, crash))
+               for worker_id, crash in [("one", None), ("two", None), ("detect", "detect"), ("move", "move")]}
+    for process in workers.values():
+        process.start()
+    for process in workers.values():
+        process.join(60)
+    assert {worker_id: process.exitcode for worker_id, process in workers.items()} == {"one": 0, "two": 0, "detect": 3, "move": 3}
+
+    # Every recording is delivered once, with its EIT
+    deliveries = (tmp_path / "deliveries.log").read_text().splitlines()
+    assert len(deliveries) == len(set(deliveries)) == RECORDINGS
+    delivered = sorted(path.name for path in (tmp_path / "output" / "Tagesschau").iterdir())
+    assert delivered == sorted(deliveries + [name.removesuffix(".ts") + ".eit" for name in deliveries])
+    assert WorkQueue(tmp_path / "output" / PIPELINE_WORK_QUEUE_FILENAME, 3).counts() == {"done": RECORDINGS}
@@ -0,0 +1,88 @@
+import logging
+
+import pytest
+
+from nashome.tmdb.fake_server import FakeTmdbServer, build_series_documents
+from nashome.tmdb.index import clear_episode_indices
+from nashome.tmdb.snapshot import get_snapshot_path, refresh_snapshot
+from nashome.utils.renamer import cleanup_recordings, find_series, get_season_list, prefetch_episode_indices
+from nashome.utils.series import Series
+from eit_data import UTF8, event, short_event
+
+POKEMON_ID = 60572
+DRAGON_BALL_Z_ID = 12971
+SEASONS = {season: [f"Episode {season} {episode}" for episode in range(1, 30)] for season in range(1, 6)}
+
+@pytest.fixture
+def server():
+    clear_episode_indices()
+    with FakeTmdbServer(build_series_documents(POKEMON_ID, "Pokemon", SEASONS)) as server:
+        yield server
+    clear_episode_indices()
+
+def write_recording(directory, stem:str, series:str, title:str) -> list:
+    eit_path = directory / f"{stem}.eit"
+    eit_path.write_bytes(event([short_event(b"deu", UTF8 + series.encode(), UTF8 + title.encode())]))
+    ts_path = directory / f"{stem}.ts"
+    ts_path.write_bytes(b"")
+    return [eit_path, ts_path]
+
+def test_find_series():
+    assert find_series("Pokemon Horizonte Folge 3 | Ein neuer Tag").name == "Pokemon Horizonte"
+    assert find_series("Pokémon: Episode 2 4").name == "Pokemon"
+    assert find_series("Tagesschau") is None
+
+def test_get_season_list(server):
+    assert get_season_list(POKEMON_ID, 3, "de-DE") == [3]
+    assert server.request_count == 0
+    assert get_season_list(POKEMON_ID, 0, "de-DE") == [1, 2, 3, 4, 5]
+    # Unknown series have no seasons
+    assert get_season_list(DRAGON_BALL_Z_ID, 0, "de-DE") == []
+
+def test_cleanup_recordings(server, tmp_path):
+    paths = []
+    for i in range(6):
+        paths += write_recording(tmp_path, f"20240101 2000 - Pokemon - rec{i}", "Pokemon", f"Episode {i % 5 + 1} {i + 3}")
+    paths += write_recording(tmp_path, "20240101 2000 - Pokemon - unknown", "Pokemon", "Ein Titel ohne Folge")
+    (tmp_path / "20240101 2000 - Pokemon - rec0.ap").write_bytes(b"")
+    paths.append(tmp_path / "20240101 2000 - Pokemon - rec0.ap")
+
+    cleanup_recordings(paths, series=True, force_tmdb=True, force_rename=True)
+
+    names = sorted(path.name for path in tmp_path.iterdir())
+    assert "Pokemon - s01e003 - Episode 1 3.eit" in names
+    assert "Pokemon - s01e003 - Episode 1 3.ts" in names
+    assert "Pokemon - s05e007 - Episode 5 7.ts" in names
+    assert "Pokemon - s01e008 - Episode 1 8.ts" in names
+    # An episode missing from TMDB keeps the EIT title
+    assert "Pokemon.ts" in names
+    assert not any(name.endswith(".ap") for name in names)
+    assert len(names) == 14
+    # Every document is requested once
+    assert len(server.requests) == len(set(server.requests))
+
+def test_cleanup_recordings_offline(server, tmp_path):
+    refresh_snapshot([Series("Pokemon", POKEMON_ID), Series("Dragon Ball Z", DRAGON_BALL_Z_ID)], ["de-DE"], path=get_snapshot_path())
+    requests = server.request_count
+
+    paths = write_recording(tmp_path, "20240101 2000 - Pokemon - rec", "Pokemon", "Episode 2 4")
+    paths += write_recording(tmp_path, "20240101 2000 - Dragon Ball Z - rec", "Dragon Ball Z", "Der Kampf")
+    cleanup_recordings(paths, series=True, force_tmdb=True, force_rename=True, offline=True)
+
+    names = sorted(path.name for path in tmp_path.iterdir())
+    assert "Pokemon - s02e004 - Episode 2 4.ts" in names
+    # A series missing from the snapshot keeps its title
+    assert "Dragon Ball Z.ts" in names
+    assert server.request_count == requests
+
+def test_prefetch_within_connection_pool(caplog):
+    documents = {}
+    for series_id in range(1, 9):
+        documents.update(build_series_documents(series_id, f"Series {series_id}", SEASONS))
+    clear_episode_indices()
+    with FakeTmdbServer(documents, latency=0.02) as server, caplog.at_level(logging.WARNING, logger="urllib3.connectionpool"):
+        prefetch_episode_indices({(series_id, 0, "de-DE") for series_id in range(1, 9)})
+    clear_episode_indices()
+    assert server.request_count == 8 * (1 + len(SEASONS))
+    # Requests beyond the pool wait for a connection instead of opening and discarding extra ones
+    assert not [record for record in caplog.records if "pool is full" in record.getMessage()]
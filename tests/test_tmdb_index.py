@@ -0,0 +1,45 @@
+import pytest
+
+from nashome.tmdb import index
+from nashome.tmdb.index import EpisodeIndex, clear_episode_indices, get_episode_index
+from nashome.utils.normalize import filter_string
+
+def season(season_number:int, names:list[str]) -> dict:
+    return {"season_number": season_number,
+            "episodes": [{"season_number": season_number, "episode_number": number, "name": name} for number, name in enumerate(names, 1)]}
+
+@pytest.fixture
+def seasons(monkeypatch):
+    documents = {1: season(1, ["Der Anfang", "Ash gegen Gary"]), 2: season(2, ["Die Rückkehr"])}
+    fetched = []
+    def get_seasons(series_id, season_ids, language_code):
+        fetched.append(tuple(season_ids))
+        return [documents[season_id] for season_id in season_ids]
+    monkeypatch.setattr(index, "get_seasons", get_seasons)
+    clear_episode_indices()
+    yield documents, fetched
+    clear_episode_indices()
+
+def test_find():
+    episode_index = EpisodeIndex([season(1, ["Der Anfang", "Ash gegen Gary", "Gary"]), season(2, ["Die Rückkehr"])], filter_string)
+    assert episode_index.find("Ash gegen Gary")["episode_number"] == 2
+    # The closest of several containing names wins
+    assert episode_index.find("Gary!")["episode_number"] == 3
+    assert episode_index.find("Die Ruckkehr (Teil 1)")["season_number"] == 2
+    assert episode_index.find("Unbekannt") is None
+
+def test_index_reused(seasons):
+    _, fetched = seasons
+    assert get_episode_index(1, [1, 2], "de-DE", filter_string) is get_episode_index(1, [1, 2], "de-DE", filter_string)
+    assert fetched == [(1, 2)]
+
+def test_index_expires(seasons, monkeypatch):
+    documents, fetched = seasons
+    assert get_episode_index(1, [1], "de-DE", filter_string).find("Neu") is None
+
+    # An episode added to the running season is found once the index is older than the season TTL
+    documents[1]["episodes"].append({"season_number": 1, "episode_number": 3, "name": "Neu"})
+    assert get_episode_index(1, [1], "de-DE", filter_string).find("Neu") is None
+    monkeypatch.setattr(index, "TMDB_SEASON_TTL", -1)
+    assert get_episode_index(1, [1], "de-DE", filter_string).find("Neu")["episode_number"] == 3
+    assert fetched == [(1,), (1,)]
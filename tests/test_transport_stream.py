@@ -0,0 +1,143 @@
+import numpy as np
+import pytest
+
+from nashome.utils import transport_stream
+from nashome.utils.transport_stream import (ACCESS_POINT_DTYPE, PTS_WRAP, access_points_path, build_packet_index, find_sync_offset, iter_sections,
+                                            load_keyframe_index, load_packet_index, packet_index_path, read_access_points, read_eit_event,
+                                            read_video_pid, view_packets)
+from eit_data import UTF8, event, extended_event, short_event
+from ts_data import FRAME_TICKS, NULL_PACKET, VIDEO_PID, eit_section, recording, section_packets
+
+START_PTS = 900000
+
+def write_recording(tmp_path, data:bytes, name:str="recording"):
+    path = tmp_path / f"{name}.ts"
+    path.write_bytes(data)
+    return path
+
+def write_access_points(path, index) -> None:
+    # Enigma2 stores the PTS as read from the stream, without unwrapping
+    access_points = np.empty(len(index.keyframe_pts), dtype=ACCESS_POINT_DTYPE)
+    access_points['offset'] = index.keyframe_offsets
+    access_points['pts'] = index.keyframe_pts % PTS_WRAP
+    access_points.tofile(path)
+
+def gop_recording(frames:int=100, first_keyframe:int=0, start_pts:int=START_PTS, **options) -> bytes:
+    return recording([start_pts + frame * FRAME_TICKS for frame in range(frames)], set(range(first_keyframe, frames, 12)), **options)
+
+def as_array(data:bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype=np.uint8)
+
+def test_find_sync_offset():
+    data = b"\x47\x00" + gop_recording(frames=10)
+    assert find_sync_offset(as_array(data)) == 2
+    assert len(view_packets(as_array(data))) == (len(data) - 2) // 188
+    assert find_sync_offset(as_array(b"\x00" * 1000)) is None
+
+def test_sections_across_packets():
+    section = eit_section(event([extended_event(b"deu", UTF8 + b"x" * 240)]))
+    packets = section_packets(0x12, section)
+    assert len(packets) == 2
+    assert list(iter_sections(view_packets(as_array(b"".join(packets))))) == [section]
+
+def test_section_dropped_on_missing_packet():
+    packets = section_packets(0x12, eit_section(event([extended_event(b"deu", UTF8 + b"x" * 200, 0), extended_event(b"deu", UTF8 + b"x" * 200, 1)])))
+    assert len(packets) == 3
+    assert not list(iter_sections(view_packets(as_array(packets[0] + packets[2]))))
+
+def test_read_video_pid():
+    assert read_video_pid(view_packets(as_array(gop_recording(frames=10)))) == VIDEO_PID
+
+def test_read_eit_event(tmp_path):
+    present = event([short_event(b"deu", UTF8 + b"Tagesschau", UTF8 + b"Nachrichten"), extended_event(b"deu", UTF8 + b"x" * 240)])
+    following = event([short_event(b"deu", UTF8 + b"Wetter", UTF8 + b"")])
+    other_service = event([short_event(b"deu", UTF8 + b"Andere", UTF8 + b"")])
+    head = section_packets(0x12, eit_section(other_service, service_id=1)) + section_packets(0x12, eit_section(following, section_number=1), 1)
+    head += section_packets(0x12, eit_section(present), 2)
+    path = write_recording(tmp_path, gop_recording(frames=10, head=head))
+    assert read_eit_event(path) == present
+
+def test_keyframe_index():
+    index = transport_stream.index_packets(as_array(gop_recording(frames=100)))
+    assert index.video_pid == VIDEO_PID
+    assert index.start_pts == START_PTS
+    assert len(index.error_offsets) == 0
+    np.testing.assert_allclose(index.keyframe_times, np.arange(0, 100, 12) * 0.04)
+    assert index.keyframe_time_after(0.5) == pytest.approx(0.96)
+    assert index.keyframe_time_after(10) == 10
+
+def test_start_within_group_of_pictures():
+    # The recording starts 5 frames before its first keyframe, ffmpeg times the stream from its first frame
+    index = transport_stream.index_packets(as_array(gop_recording(frames=60, first_keyframe=5)))
+    assert index.start_pts == START_PTS
+    assert index.keyframe_times[0] == pytest.approx(0.2)
+
+def test_start_pts_before_first_pes():
+    # A B-frame displayed before the first decoded frame starts the stream
+    frame_pts = [START_PTS + FRAME_TICKS, START_PTS] + [START_PTS + frame * FRAME_TICKS for frame in range(2, 30)]
+    index = transport_stream.index_packets(as_array(recording(frame_pts, {0, 12, 24})))
+    assert index.start_pts == START_PTS
+    np.testing.assert_allclose(index.keyframe_times, [0.04, 0.48, 0.96])
+
+def test_pts_wrap():
+    index = transport_stream.index_packets(as_array(gop_recording(frames=100, start_pts=PTS_WRAP - 30 * FRAME_TICKS)))
+    assert np.all(np.diff(index.keyframe_pts) == 12 * FRAME_TICKS)
+    np.testing.assert_allclose(index.keyframe_times, np.arange(0, 100, 12) * 0.04)
+
+def test_continuity_errors():
+    data = bytearray(gop_recording(frames=20, drop=(7, 2)))
+    index = transport_stream.index_packets(as_array(bytes(data)))
+    assert list(index.error_pids) == [VIDEO_PID]
+
+    # Lost sync counts as error
+    data[-188] = 0x00
+    index = transport_stream.index_packets(as_array(bytes(data)))
+    assert list(index.error_offsets[-1:]) == [len(data) - 188]
+    assert index.error_pids[-1] == 0x1FFF
+
+def test_packet_index_sidecar(tmp_path):
+    path = write_recording(tmp_path, gop_recording(frames=30))
+    assert load_packet_index(path) is not None
+    assert not packet_index_path(path).exists()
+
+    index = load_packet_index(path, save=True)
+    assert packet_index_path(path).is_file()
+    loaded = load_packet_index(path)
+    assert loaded.start_pts == index.start_pts
+    np.testing.assert_array_equal(loaded.keyframe_offsets, index.keyframe_offsets)
+
+    # A sidecar of a changed recording is rebuilt
+    with open(path, 'ab') as f:
+        f.write(NULL_PACKET)
+    assert load_packet_index(path).packet_count == index.packet_count + 1
+
+def test_access_points(tmp_path, monkeypatch):
+    path = write_recording(tmp_path, gop_recording(frames=100, first_keyframe=5, start_pts=PTS_WRAP - 30 * FRAME_TICKS), "20240101 2000 - Das Erste HD - Tagesschau")
+    index = build_packet_index(path)
+    write_access_points(tmp_path / "20240101 2000 - Das Erste HD - Tagesschau.ts.ap", index)
+    assert access_points_path(path).is_file()
+
+    # The keyframes come from the .ap, only the start of the stream is read
+    monkeypatch.setattr(transport_stream, "build_packet_index", None)
+    keyframes = load_keyframe_index(path)
+    np.testing.assert_array_equal(keyframes.keyframe_offsets, index.keyframe_offsets)
+    np.testing.assert_allclose(keyframes.keyframe_times, index.keyframe_times)
+    assert keyframes.keyframe_times[0] == pytest.approx(0.2)
+
+def test_access_points_rejected(tmp_path):
+    path = write_recording(tmp_path, gop_recording(frames=30))
+    index = build_packet_index(path)
+
+    # Only <name>.ts.ap belongs to the recording
+    write_access_points(tmp_path / "recording.ap", index)
+    assert read_access_points(path) is None
+
+    # A truncated .ap, or one of a longer recording
+    ap_path = access_points_path(path)
+    write_access_points(ap_path, index)
+    ap_path.write_bytes(ap_path.read_bytes()[:-3])
+    assert read_access_points(path) is None
+    index.keyframe_offsets[-1] = path.stat().st_size
+    write_access_points(ap_path, index)
+    assert read_access_points(path) is None
+    assert load_keyframe_index(path) is not None
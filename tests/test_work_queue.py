@@ -0,0 +1,61 @@
+import time
+from pathlib import Path
+
+from nashome.utils.work_queue import WorkQueue
+
+def make_queue(tmp_path, max_attempts:int=3) -> WorkQueue:
+    work_queue = WorkQueue(tmp_path / "queue.sqlite", max_attempts)
+    work_queue.enqueue([(Path("Pokemon/b.ts"), "Pokemon", 2.0), (Path("Pokemon/a.ts"), "Pokemon", 1.0)])
+    return work_queue
+
+def test_claim_cheapest_first(tmp_path):
+    work_queue = make_queue(tmp_path)
+    assert work_queue.enqueue([(Path("Pokemon/a.ts"), "Pokemon", 0.5)]) == 0
+    first, second = work_queue.claim("one", 60), work_queue.claim("two", 60)
+    assert (first.source, second.source) == (Path("Pokemon/a.ts"), Path("Pokemon/b.ts"))
+    assert work_queue.claim("three", 60) is None
+    assert work_queue.complete(first.source, "one", True)
+    assert not work_queue.complete(second.source, "one", True)
+    assert work_queue.counts() == {"done": 1, "claimed": 1}
+
+def test_expired_lease_reclaimed(tmp_path):
+    work_queue = make_queue(tmp_path, max_attempts=2)
+    item = work_queue.claim("crashed", 0.01)
+    time.sleep(0.02)
+    assert work_queue.counts()["expired"] == 1
+    reclaimed = work_queue.claim("other", 60)
+    assert (reclaimed.source, reclaimed.attempts, reclaimed.previous_worker) == (item.source, 2, "crashed")
+    assert not work_queue.heartbeat(item.source, "crashed", 60)
+
+    # The last attempt is not claimed again
+    work_queue.claim("slow", 0.01)
+    time.sleep(0.02)
+    work_queue.claim("crashed", 0.01)
+    time.sleep(0.02)
+    assert work_queue.claim("other", 60) is None
+    assert work_queue.counts() == {"claimed": 1, "failed": 1}
+
+def test_crash_while_moving(tmp_path):
+    work_queue = make_queue(tmp_path)
+    first, second = work_queue.claim("one", 60), work_queue.claim("two", 60)
+    output = Path("Pokemon/Pokemon - s01e001 - a.ts")
+    assert work_queue.start_moving(first.source, "one", output, 0.01)
+    assert work_queue.start_moving(second.source, "two", Path("Pokemon/b.ts"), 0.01)
+    assert work_queue.counts() == {"moving": 2}
+
+    # One worker delivered its output before it crashed, the other one did not
+    (tmp_path / "Pokemon").mkdir()
+    (tmp_path / output).write_bytes(b"")
+    time.sleep(0.02)
+    assert work_queue.counts() == {"expired": 2}
+    reclaimed = work_queue.claim("three", 60)
+    assert reclaimed.source == second.source
+    assert work_queue.claim("three", 60) is None
+    assert work_queue.counts() == {"done": 1, "claimed": 1}
+
+def test_moving_needs_lease(tmp_path):
+    work_queue = make_queue(tmp_path)
+    item = work_queue.claim("slow", 0.01)
+    time.sleep(0.02)
+    work_queue.claim("other", 60)
+    assert not work_queue.start_moving(item.source, "slow", Path("Pokemon/a.ts"), 60)
@@ -0,0 +1,66 @@
+"""
+Builders for synthetic MPEG transport streams: PAT, PMT, EIT sections and a video PES stream.
+"""
+import struct
+
+TS_PACKET_SIZE = 188
+SERVICE_ID = 0x2B66
+PMT_PID = 0x100
+VIDEO_PID = 0x200
+NULL_PACKET = bytes([0x47, 0x1F, 0xFF, 0x10]) + b"\xff" * 184
+
+# 25 frames per second in 90 kHz PTS ticks
+FRAME_TICKS = 3600
+
+def section_packets(pid:int, section:bytes, continuity_counter:int=0) -> list[bytes]:
+    """Splits a section into packets, the first one starts with a zero pointer field."""
+    packets = []
+    data = b"\x00" + section
+    first = True
+    while data:
+        chunk, data = data[:184], data[184:]
+        header = bytes([0x47, (0x40 if first else 0) | (pid >> 8), pid & 0xFF, 0x10 | (continuity_counter & 0x0F)])
+        packets.append(header + chunk + b"\xff" * (184 - len(chunk)))
+        first = False
+        continuity_counter += 1
+    return packets
+
+def psi_section(table_id:int, extension:int, body:bytes, section_number:int=0) -> bytes:
+    length = 5 + len(body) + 4
+    return bytes([table_id, 0xB0 | (length >> 8), length & 0xFF]) + struct.pack(">H", extension) + bytes([0xC1, section_number, 0x01]) + body + b"\x00" * 4
+
+def pat(service_id:int=SERVICE_ID, pmt_pid:int=PMT_PID) -> bytes:
+    return psi_section(0x00, 1, struct.pack(">HH", service_id, 0xE000 | pmt_pid))
+
+def pmt(service_id:int=SERVICE_ID, video_pid:int=VIDEO_PID) -> bytes:
+    # An audio stream before the video stream
+    streams = bytes([0x04]) + struct.pack(">HH", 0xE000 | (video_pid + 1), 0xF000) + bytes([0x1B]) + struct.pack(">HH", 0xE000 | video_pid, 0xF000)
+    return psi_section(0x02, service_id, struct.pack(">HH", 0xE000 | video_pid, 0xF000) + streams)
+
+def eit_section(event:bytes, service_id:int=SERVICE_ID, section_number:int=0) -> bytes:
+    return psi_section(0x4E, service_id, struct.pack(">HHBB", 1, 1, 0, 0x4E) + event, section_number)
+
+def pes_packet(continuity_counter:int, pts:int=None, random_access:bool=False, pid:int=VIDEO_PID) -> bytes:
+    """A video packet, with pts it starts a PES packet and carries an adaptation field."""
+    if pts is None:
+        return bytes([0x47, pid >> 8, pid & 0xFF, 0x10 | (continuity_counter & 0x0F)]) + b"\xbb" * 184
+    encoded_pts = bytes([0x21 | ((pts >> 29) & 0x0E), (pts >> 22) & 0xFF, 0x01 | ((pts >> 14) & 0xFE), (pts >> 7) & 0xFF, 0x01 | ((pts << 1) & 0xFE)])
+    pes_header = b"\x00\x00\x01\xe0\x00\x00\x80\x80\x05" + encoded_pts
+    adaptation_field = bytes([1, 0x40 if random_access else 0])
+    payload = pes_header + b"\xaa" * (184 - len(adaptation_field) - len(pes_header))
+    return bytes([0x47, 0x40 | (pid >> 8), pid & 0xFF, 0x30 | (continuity_counter & 0x0F)]) + adaptation_field + payload
+
+def recording(frame_pts:list[int], keyframes:set[int], packets_per_frame:int=4, drop:tuple[int, int]=None, head:list[bytes]=()) -> bytes:
+    """
+    A recording of one video stream with the given PTS per frame (in decoding order), frames in keyframes
+    are random access points. drop=(frame, packet) leaves out one packet, head are packets before the PAT.
+    """
+    packets = list(head) + section_packets(0x0000, pat()) + section_packets(PMT_PID, pmt())
+    continuity_counter = 0
+    for frame, pts in enumerate(frame_pts):
+        for packet in range(packets_per_frame):
+            if drop != (frame, packet):
+                packets.append(pes_packet(continuity_counter, pts % (1 << 33) if packet == 0 else None, packet == 0 and frame in keyframes))
+            continuity_counter += 1
+        packets.append(NULL_PACKET)
+    return b"".join(packets)